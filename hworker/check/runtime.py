@@ -18,7 +18,7 @@ from typing import Iterator
 
 from ._tools import get_result_ID
 from ..config import get_check_directory, get_task_info, get_prog_name
-from ..depot.database.functions import store
+from ..depot import store
 from ..depot.objects import Check, Solution, CheckResult, CheckCategoryEnum, VerdictEnum
 from ..log import get_logger
 
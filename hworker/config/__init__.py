@@ -303,6 +303,16 @@ def get_depot_info() -> dict[str, str]:
     return config()["depot"]
 
 
+def get_depot_pragmas(profile: str | None = None) -> dict[str, str | int]:
+    """Get SQLite pragmas of depot performance profile
+
+    :param profile: profile name, configured one if None
+    :return: pragma name: value dict
+    """
+    depot = get_depot_info()
+    return depot["pragmas"][profile or depot["profile"]]
+
+
 def get_publish_info() -> dict[str, str]:
     """Get publish info dict
 
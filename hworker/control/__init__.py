@@ -2,8 +2,10 @@ import random
 from pathlib import Path
 
 from .. import config, deliver, depot, make, publish, score
+from ..log import get_logger
 
 
+@depot.performance_profile("bulk-ingest")
 def download_all():
     """Download all solutions from several backends
 
@@ -12,6 +14,7 @@ def download_all():
     deliver.download_all()
 
 
+@depot.performance_profile("serve")
 def start_publish():
     """Runs publish server
 
@@ -85,6 +88,7 @@ def generate_homeworks_with_versions():
                 )
 
 
+@depot.performance_profile("bulk-ingest")
 def do_score():
     """Perform qualifiers and get score results
 
@@ -95,6 +99,7 @@ def do_score():
     score.perform_qualifiers()
 
 
+@depot.performance_profile("bulk-ingest")
 def download_store_check_results():
     """Get check results from homeworks
 
@@ -123,6 +128,49 @@ def big_red_button():
     start_publish()
 
 
+def kept_versions(task_id: str, timestamps: list[float], keep_last: int = None, deadlines: bool = False) -> set[float]:
+    """Choose object versions retention policy keeps
+
+    :param task_id: task of the object
+    :param timestamps: timestamps of all object versions
+    :param keep_last: number of latest versions to keep, only the latest one if None
+    :param deadlines: also keep latest versions that fit soft and hard task deadlines
+    :return: timestamps of versions to keep
+    """
+    timestamps = sorted(timestamps, reverse=True)
+    kept = set(timestamps[: keep_last or 1])
+    if deadlines:
+        task = config.get_task_info(task_id)
+        if not {"soft_deadline", "hard_deadline"} <= task.keys():
+            # relevance is unknown, so nothing can be dropped
+            return set(timestamps)
+        for deadline in (task["soft_deadline"], task["hard_deadline"]):
+            kept.update(next(([ts] for ts in timestamps if make.fit_deadline(ts, deadline)), []))
+    return kept
+
+
+def maintain(keep_last: int = None, deadlines: bool = False) -> dict[str, tuple[int, int | None]]:
+    """Drop outdated versions of homeworks and solutions, then compact the depot
+
+    :param keep_last: number of latest versions to keep
+    :param deadlines: keep versions that fit task deadlines
+    :return: table name: (number of rows, size in bytes or None if unknown) report
+    """
+    if keep_last is not None or deadlines:
+        for obj_type in depot.objects.Homework, depot.objects.Solution:
+            versions: dict[str, tuple[str, list[float]]] = {}
+            for obj in depot.search(obj_type, return_fields=["ID", "TASK_ID", "timestamp"]):
+                versions.setdefault(obj.ID, (obj.TASK_ID, []))[1].append(obj.timestamp)
+            outdated = [
+                (ID, ts)
+                for ID, (task_id, timestamps) in versions.items()
+                for ts in set(timestamps) - kept_versions(task_id, timestamps, keep_last, deadlines)
+            ]
+            get_logger(__name__).info(f"Dropping {len(outdated)} outdated {obj_type.__name__} versions")
+            depot.delete_versions(obj_type, outdated)
+    return depot.maintain()
+
+
 def generate_static_html():
     target_path = Path(config.get_publish_info()["static_folder"])
     target_path.mkdir(parents=True, exist_ok=True)
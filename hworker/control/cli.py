@@ -14,6 +14,7 @@ import secrets
 import shlex
 import shutil
 import sys
+import tarfile
 import tempfile
 from tomllib import load
 from pathlib import Path
@@ -127,30 +128,30 @@ class HWorker(cmd.Cmd):
             case ["task"]:
                 return self.filtertext(config.get_tasks_list(), word, shift=delta, quote=quote)
 
-    def show_objects(self, Type, *options, actual=True, flt=".*", dump=False):
+    def show_objects(self, Type, *options, actual=True, flt=None, dump=False):
         print(f"\t{Type.__name__}:")
         optnames = ("ID",)
         rules = {optname: Rule(optname, "==", opt) for optname, opt in zip(optnames, options)}
-        for hw in depot.search(Type, *rules.values(), actual=actual):
+        if flt is not None:
             try:
-                resflt = re.search(flt, hw["ID"])
-            except Exception as E:
+                rules["flt"] = Rule("ID", "regexp", flt)
+            except ValueError as E:
                 log(f"Regexp error: {E}")
                 return
-            if resflt:
-                print(hw)
-                if ("ID" in rules or dump) and hasattr(hw, "content"):
-                    for fname in hw.content:
-                        try:
-                            content = hw.content[fname].decode()
-                        except Exception:
-                            content = str(hw.content[fname])
-                        print(f"\t{fname}:\n{content}" if dump else f"\t{fname}")
-                if dump:
-                    if hasattr(hw, "checks"):
-                        pprint(getattr(hw, "checks"))
-                    if stderr := getattr(hw, "stderr", None):
-                        print(stderr.decode(errors="replace"))
+        for hw in depot.search(Type, *rules.values(), actual=actual):
+            print(hw)
+            if ("ID" in rules or dump) and hasattr(hw, "content"):
+                for fname in hw.content:
+                    try:
+                        content = hw.content[fname].decode()
+                    except Exception:
+                        content = str(hw.content[fname])
+                    print(f"\t{fname}:\n{content}" if dump else f"\t{fname}")
+            if dump:
+                if hasattr(hw, "checks"):
+                    pprint(getattr(hw, "checks"))
+                if stderr := getattr(hw, "stderr", None):
+                    print(stderr.decode(errors="replace"))
 
     def do_show(self, arg):
         """Show objects or individual object"""
@@ -203,7 +204,12 @@ TYPE can be {', '.join(self.whatshow)}
                 return self.filtertext(self.whatshow, word, shift=delta)
             case [Type]:
                 if Type in self.whatshow:
-                    ids = [hw.ID for hw in depot.search(self.whatshow[Type], actual=True)]
+                    ids = [
+                        hw.ID
+                        for hw in depot.search(
+                            self.whatshow[Type], Rule("ID", "startswith", word), actual=True, return_fields=["ID"]
+                        )
+                    ]
                     return self.filtertext(ids, word, shift=delta, quote=quote)
             case [Type, _]:
                 return ["all", "dump"]
@@ -223,14 +229,20 @@ TYPE can be {', '.join(self.whatshow)}
             return self.filtertext(globals(), prefix)
 
     def do_download(self, arg):
-        """Download all homeworks (do not parse if "only" parmeter is given)"""
+        """Download all homeworks and parse them (do not parse if "only" parmeter is given, parse only new if "new")"""
         args = self.shplit(arg)
-        deliver.download_all()
-        if args != ["only"]:
-            make.parse_all_stored_homeworks()
+        with depot.performance_profile("bulk-ingest"):
+            deliver.download_all()
+            match args:
+                case ["only"]:
+                    pass
+                case ["new"]:
+                    make.parse_new_homeworks()
+                case _:
+                    make.parse_all_stored_homeworks()
 
     def complete_download(self, text, line, begidx, endidx):
-        objnames = ("only",)
+        objnames = ("only", "new")
         return self.filtertext(objnames, text)
 
     def do_score(self, arg):
@@ -256,11 +268,129 @@ TYPE can be {', '.join(self.whatshow)}
     def complete_check(self, text, line, begidx, endidx):
         (_, *args, word), delta, quote = self.qsplit(line, text, begidx, endidx)
         const = ["all", "new"]
-        ids = [sol.ID for sol in depot.search(depot.objects.Solution, actual=True)]
+        ids = [sol.ID for sol in depot.search(depot.objects.Solution, actual=True, return_fields=["ID"])]
         match args:
             case []:
                 return self.filtertext(ids + const, word, shift=delta, quote=quote)
 
+    def do_maintain(self, arg):
+        """Drop outdated homework and solution versions, compact database and report table sizes"""
+        args = self.shplit(arg)
+        keep_last, deadlines = None, "deadlines" in args
+        match [word for word in args if word != "deadlines"]:
+            case []:
+                pass
+            case ["last", number] if number.isdigit() and int(number) > 0:
+                keep_last = int(number)
+            case _:
+                log(f"Wrong maintain parameters: {arg}")
+                return
+        report = control.maintain(keep_last, deadlines)
+        print(f"{'table':24} {'rows':>10} {'size':>12}")
+        for name, (rows, size) in report.items():
+            print(f"{name:24} {rows:>10} {'?' if size is None else size:>12}")
+
+    def help_maintain(self):
+        res = """Drop outdated versions of homeworks and solutions, compact database and report table sizes
+
+maintain                  - only compact database, keeping all versions
+maintain last N           - keep N latest versions of every homework and solution
+maintain deadlines        - keep the latest versions and ones fitting soft and hard task deadlines
+maintain last N deadlines - keep both
+        """
+        print(res, file=sys.stderr)
+
+    def complete_maintain(self, text, line, begidx, endidx):
+        return self.filtertext(("last", "deadlines"), text)
+
+    def do_grep(self, arg):
+        """Find latest (or "all") solution versions by their text, optionally of given task only"""
+        args = self.shplit(arg)
+        actual = args[:1] != ["all"]
+        match args[0 if actual else 1 :]:
+            case [query]:
+                task = None
+            case [query, task]:
+                pass
+            case _:
+                log(f"Wrong grep parameters: {arg}")
+                return
+        try:
+            found = depot.fulltext(query, task=task, actual=actual)
+        except ValueError as E:
+            log(E)
+            return
+        for file in found:
+            version = "" if actual else f" {datetime.datetime.fromtimestamp(file.timestamp)}"
+            print(f"{file.ID}/{file.path}{version}")
+
+    def help_grep(self):
+        res = """Find solution files by their text
+
+grep QUERY            - search latest versions of all solutions
+grep QUERY TASK       - search latest versions of TASK solutions
+grep all QUERY [TASK] - search all solution versions
+
+QUERY is a full-text query: words (identifiers included) joined with AND, OR, NOT, "phrases" or prefix* ones,
+e.g. grep eval, grep 'numpy OR scipy', grep '"import numpy"'
+        """
+        print(res, file=sys.stderr)
+
+    def complete_grep(self, text, line, begidx, endidx):
+        (_, *args, word), delta, quote = self.qsplit(line, text, begidx, endidx)
+        match args:
+            case []:
+                return self.filtertext(["all"], word, shift=delta, quote=quote)
+            case ["all", _] | [_]:
+                return self.filtertext(config.get_tasks_list(), word, shift=delta, quote=quote)
+
+    def do_depot(self, arg):
+        """Save depot to a snapshot archive or restore it from one"""
+        try:
+            match self.shplit(arg):
+                case ["snapshot", path]:
+                    manifest = depot.snapshot(path)
+                case ["restore", path]:
+                    manifest = depot.restore(path)
+                case _:
+                    log(f"Wrong depot parameters: {arg}")
+                    return
+        except (ValueError, OSError, tarfile.TarError) as E:
+            log(E)
+            return
+        print(f"{'table':24} {'rows':>10}")
+        for name, rows in manifest["tables"].items():
+            print(f"{name:24} {rows:>10}")
+
+    def help_depot(self):
+        res = """Save depot to a snapshot archive or restore it from one
+
+depot snapshot PATH - write consistent copy of the depot and its external files to PATH archive
+depot restore PATH  - replace depot content with PATH archive content
+        """
+        print(res, file=sys.stderr)
+
+    def complete_depot(self, text, line, begidx, endidx):
+        return self.filtertext(("snapshot", "restore"), text)
+
+    def do_stats(self, arg):
+        """Show depot call statistics of this session (slowest first), or forget them with "reset" parameter"""
+        match self.shplit(arg):
+            case []:
+                print(f"{'call':64} {'count':>8} {'total':>10} {'max':>10} {'rows':>10}")
+                for call, counters in depot.get_stats().items():
+                    print(
+                        f"{call:64} {counters['count']:>8} {counters['total']:>10.3f} "
+                        f"{counters['max']:>10.3f} {counters['rows']:>10}"
+                    )
+            case ["reset"]:
+                depot.stats.reset()
+            case _:
+                log(f"Wrong stats parameters: {arg}")
+
+    def complete_stats(self, text, line, begidx, endidx):
+        return self.filtertext(("reset",), text)
+
     def do_logging(self, arg):
         """Set console log level"""
         objnames = logging.getLevelNamesMapping()
@@ -362,6 +492,7 @@ def create_personal(path: Path, timelimit: str = "") -> tempfile.TemporaryDirect
     conf = {
         "file": {"root_path": str(repo), "users": {"user": user}},
         "modules": {"deliver": ["file"]},
+        "depot": {"backend": "memory"},
         "tasks": {task: {"open_date": datetime.date.today()}},
     }
     if timelimit:
@@ -11,7 +11,7 @@ import git
 
 from ... import depot
 from ...config import get_git_directory, get_repos, get_git_uids, repo_to_uid, get_tasks_list, get_task_info
-from ...depot import store
+from ...depot import store_many
 from ...depot.objects import Homework, FileObject
 from ...log import get_logger
 
@@ -72,7 +72,8 @@ def clone_pull(repo: str) -> None:
 
 def run_all(function, args):
     """Try to run function against each arg in parrallel."""
-    if get_start_method() == "fork":
+    # objects stored by workers would be lost unless depot is shared with them
+    if get_start_method() == "fork" and depot.is_shared():
         with Pool() as p:
             res = p.map(function, args)
     else:
@@ -136,7 +137,8 @@ def download_all() -> None:
     depot.store(depot.objects.UpdateTime(name="Git deliver", timestamp=datetime.datetime.now().timestamp()))
     get_logger(__name__).info("Downloading (or updating) all repos and store them")
     update_all()
-    run_all(download_user, get_git_uids())
+    with depot.single_writer():
+        run_all(download_user, get_git_uids())
     # for student_id in tqdm(get_git_uids(), colour="green", desc="Git download", delay=2, unit="repo"):
     #     download_user(student_id)
 
@@ -146,12 +148,13 @@ def download_user(student_id: str) -> bool:
     if not repo.heads:
         get_logger(__name__).warning(f"Got empty repo from {student_id} student!")
         return False
+    homeworks = []
     for task in get_tasks_list():
         if os.path.isdir((task_path := Path(local_path(student_id), get_task_info(task).get("deliver_ID", "")))):
             commits = [_ for _ in get_commits(repo, task_path) if _]
             for commit in commits:
                 content = get_homework_content(repo, task_path, commit[0])
-                store(
+                homeworks.append(
                     Homework(
                         content=content,
                         ID=f"{_depot_prefix}.{student_id}/{task}",
@@ -161,4 +164,5 @@ def download_user(student_id: str) -> bool:
                         is_broken=False,
                     )
                 )
+    store_many(homeworks)
     return True
@@ -2,5 +2,63 @@
 Just import
 """
 
-from . import objects
-from .database import store, search, delete
+import contextlib
+import functools
+from types import ModuleType
+from typing import Callable, Iterator
+
+from . import objects, cache
+from . import database, memory, stats, writer
+from .. import config
+
+_backends: dict[str, ModuleType] = {"sqlite": database, "memory": memory}
+# Backend name to use instead of configured one
+_backend_name: str | None = None
+
+
+def _backend() -> ModuleType:
+    return _backends[_backend_name or config.get_depot_info().get("backend", "sqlite")]
+
+
+def _dispatch(name: str) -> Callable:
+    # backend is chosen on every call, so config may be (re)read after import
+    @functools.wraps(getattr(database, name))
+    def function(*args, **kwargs):
+        backend = writer if name in writer.routed and writer.is_active() else _backend()
+        return getattr(backend, name)(*args, **kwargs)
+
+    return stats.measured(name, function)
+
+
+store = _dispatch("store")
+store_many = _dispatch("store_many")
+search = _dispatch("search")
+search_many = _dispatch("search_many")
+aggregate = _dispatch("aggregate")
+delete = _dispatch("delete")
+delete_versions = _dispatch("delete_versions")
+fulltext = _dispatch("fulltext")
+maintain = _dispatch("maintain")
+changes = _dispatch("changes")
+last_seq = _dispatch("last_seq")
+get_cursor = _dispatch("get_cursor")
+set_cursor = _dispatch("set_cursor")
+snapshot = _dispatch("snapshot")
+restore = _dispatch("restore")
+single_writer = writer.single_writer
+get_stats = stats.get_stats
+
+
+def is_shared() -> bool:
+    """Check if forked processes share depot storage, memory backend storage belongs to its process only"""
+    return _backend() is not memory
+
+
+@contextlib.contextmanager
+def performance_profile(name: str) -> Iterator[None]:
+    """Use another depot performance profile within context
+
+    :param name: profile name from depot pragmas config
+    """
+    with _backend().performance_profile(name):
+        yield
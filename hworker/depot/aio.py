@@ -0,0 +1,110 @@
+"""Asyncio counterparts of depot read functions.
+
+Depot calls block, so they are run in a bounded pool of threads, each taking its own connection from the engine pool.
+Independent queries awaited together, e.g. with asyncio.gather(), run concurrently.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+from . import objects
+from . import aggregate as _aggregate, search as _search, search_many as _search_many
+
+# no more threads than connections the database engine keeps open
+_max_workers = 10
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="depot")
+    return _executor
+
+
+async def _run(function: Callable, *args, **kwargs) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), functools.partial(function, *args, **kwargs)
+    )
+
+
+def _search_list(*args, **kwargs) -> list:
+    # found objects are read in the worker thread, not lazily in the event loop one
+    return list(_search(*args, **kwargs))
+
+
+async def search(
+    obj_type: type[objects.StoreObject],
+    *criteria: objects.Criteria,
+    return_fields: list[str] = None,
+    actual: bool = False,
+    as_of: float = None,
+    **options,
+) -> list[objects.StoreObject]:
+    """Search for objects without blocking event loop
+    :param obj_type: type of object to search
+    :param criteria: criteria for searching
+    :param return_fields: filter for return fields
+    :param actual: return only latest version of object (grouping them by id)
+    :param as_of: return only latest version of object not later than this timestamp
+    :param options: database backend options
+    :return: list of found objects
+    """
+    return await _run(
+        _search_list, obj_type, *criteria, return_fields=return_fields, actual=actual, as_of=as_of, **options
+    )
+
+
+async def first(
+    obj_type: type[objects.StoreObject],
+    *criteria: objects.Criteria,
+    return_fields: list[str] = None,
+    actual: bool = False,
+    as_of: float = None,
+) -> Optional[objects.StoreObject]:
+    """Search for the first (latest) object without blocking event loop
+    :param obj_type: type of object to search
+    :param criteria: criteria for searching
+    :param return_fields: filter for return fields
+    :param actual: search only latest versions of objects
+    :param as_of: search only latest versions of objects not later than this timestamp
+    :return: found object or None
+    """
+    return await _run(_search, obj_type, *criteria, return_fields=return_fields, first=True, actual=actual, as_of=as_of)
+
+
+async def search_many(
+    obj_type: type[objects.StoreObject],
+    ids: Iterable[str],
+    *criteria: objects.Criteria,
+    return_fields: list[str] = None,
+    actual: bool = True,
+) -> dict[str, objects.StoreObject] | dict[str, list[objects.StoreObject]]:
+    """Search for objects with given IDs without blocking event loop
+    :param obj_type: type of objects to search
+    :param ids: IDs of objects
+    :param criteria: additional criteria for searching
+    :param return_fields: filter for return fields, ID is always returned
+    :param actual: return only latest version of objects, all versions otherwise
+    :return: found objects by ID, lists of versions (latest first) for versioned objects if not actual
+    """
+    return await _run(_search_many, obj_type, list(ids), *criteria, return_fields=return_fields, actual=actual)
+
+
+async def aggregate(
+    obj_type: type[objects.StoreObject],
+    *criteria: objects.Criteria,
+    group_by: list[str] = None,
+    metrics: dict[str, str],
+    actual: bool = False,
+) -> list[dict[str, Any]]:
+    """Aggregate object fields without blocking event loop
+    :param obj_type: type of objects to aggregate
+    :param criteria: criteria for searching
+    :param group_by: fields to group objects by, all found objects are one group if None
+    :param metrics: field name: aggregate function (one of objects.aggregate_functions) dictionary
+    :param actual: aggregate only latest versions of objects
+    :return: list of group field and metric values dictionaries
+    """
+    return await _run(_aggregate, obj_type, *criteria, group_by=group_by, metrics=metrics, actual=actual)
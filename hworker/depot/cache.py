@@ -0,0 +1,203 @@
+"""Opt-in identity cache of depot lookups by ID.
+
+Searches for the first object with given ID (and timestamp, if any) are answered from a size-bounded
+LRU map while the cache is enabled. Every lookup gets its own copy of the found object, so it may be modified.
+Storing and deleting objects invalidates affected entries once written. The cache is suspended while objects
+are stored by another process, as its writes can not invalidate entries of this one.
+"""
+import contextlib
+import copy
+from collections import OrderedDict
+from typing import Any, Iterator, NamedTuple
+
+from .objects import Criteria, StoreObject
+
+_default_maxsize = 4096
+missing = object()
+
+Key = tuple[type[StoreObject], str] | tuple[type[StoreObject], str, float]
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class IdentityCache:
+    """LRU map of looked up objects by (type, ID[, timestamp])"""
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self.suspended = False
+        self.hits = self.misses = 0
+        self._entries: OrderedDict[Key, StoreObject | None] = OrderedDict()
+        self._by_id: dict[tuple[type[StoreObject], str], set[Key]] = {}
+
+    def get(self, key: Key) -> Any:
+        """Get cached object, counting hit or miss
+
+        :param key: lookup key
+        :return: found object (None included) or missing
+        """
+        found = self._entries.get(key, missing)
+        if found is missing:
+            self.misses += 1
+            return missing
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return copy.deepcopy(found)
+
+    def put(self, key: Key, obj: StoreObject | None) -> None:
+        """Remember lookup result, evicting least recently used ones
+
+        :param key: lookup key
+        :param obj: found object or None
+        """
+        if self.maxsize <= 0 or self.suspended:
+            return
+        self._entries[key] = copy.deepcopy(obj)
+        self._entries.move_to_end(key)
+        self._by_id.setdefault(key[:2], set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._forget(next(iter(self._entries)))
+
+    def _forget(self, key: Key) -> None:
+        del self._entries[key]
+        keys = self._by_id[key[:2]]
+        keys.discard(key)
+        if not keys:
+            del self._by_id[key[:2]]
+
+    def invalidate(self, obj_type: type[StoreObject], ID: str | None = None) -> None:
+        """Forget cached lookups of given object or all objects of given type
+
+        :param obj_type: object type
+        :param ID: object ID, all objects of the type if None
+        """
+        if ID is not None:
+            affected = list(self._by_id.get((obj_type, ID), ()))
+        else:
+            affected = [key for key in self._entries if key[0] is obj_type]
+        for key in affected:
+            self._forget(key)
+
+    def invalidate_all(self) -> None:
+        """Forget all lookups"""
+        self._entries.clear()
+        self._by_id.clear()
+
+    def clear(self) -> None:
+        """Forget all lookups and reset counters"""
+        self.invalidate_all()
+        self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Get cache statistics
+
+        :return: hits, misses, maxsize and current size
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+_cache = IdentityCache()
+
+
+def lookup_key(obj_type: type[StoreObject], criteria: tuple[Criteria, ...]) -> Key | None:
+    """Get cache key of search criteria, if they are an ID lookup
+
+    :param obj_type: type of object to search
+    :param criteria: search criteria
+    :return: (type, ID) or (type, ID, timestamp) key, None if criteria are not a plain lookup
+    """
+    if not is_enabled() or any(item.condition != "==" for item in criteria):
+        return None
+    values = {item.field_name: item.field_value for item in criteria}
+    if len(values) != len(criteria) or "ID" not in values or not set(values) <= {"ID", "timestamp"}:
+        return None
+    return (obj_type, values["ID"]) if "timestamp" not in values else (obj_type, values["ID"], values["timestamp"])
+
+
+def get(key: Key) -> Any:
+    """Get cached lookup result
+
+    :param key: lookup key
+    :return: found object (None included) or missing
+    """
+    return _cache.get(key)
+
+
+def put(key: Key, obj: StoreObject | None) -> None:
+    """Remember lookup result
+
+    :param key: lookup key
+    :param obj: found object or None
+    """
+    _cache.put(key, obj)
+
+
+def invalidate(obj_type: type[StoreObject], ID: str | None = None) -> None:
+    """Forget cached lookups of given object or all objects of given type
+
+    :param obj_type: object type
+    :param ID: object ID, all objects of the type if None
+    """
+    _cache.invalidate(obj_type, ID)
+
+
+def is_enabled() -> bool:
+    """Check if identity cache is on and not suspended"""
+    return _cache.maxsize > 0 and not _cache.suspended
+
+
+def enable(maxsize: int = _default_maxsize) -> None:
+    """Turn identity cache on
+
+    :param maxsize: maximum number of cached lookups
+    """
+    _cache.maxsize = maxsize
+
+
+def disable() -> None:
+    """Turn identity cache off and forget everything"""
+    _cache.maxsize = 0
+    _cache.clear()
+
+
+@contextlib.contextmanager
+def enabled(maxsize: int = _default_maxsize) -> Iterator[IdentityCache]:
+    """Turn identity cache on within context
+
+    :param maxsize: maximum number of cached lookups
+    :return: the cache
+    """
+    previous = _cache.maxsize
+    enable(maxsize)
+    try:
+        yield _cache
+    finally:
+        if previous > 0:
+            enable(previous)
+        else:
+            disable()
+
+
+@contextlib.contextmanager
+def suspended() -> Iterator[None]:
+    """Bypass identity cache within context, forgetting cached lookups on exit"""
+    previous = _cache.suspended
+    _cache.suspended = True
+    try:
+        yield
+    finally:
+        _cache.suspended = previous
+        _cache.invalidate_all()
+
+
+def info() -> CacheInfo:
+    """Get identity cache statistics
+
+    :return: hits, misses, maxsize and current size
+    """
+    return _cache.info()
@@ -1,4 +1,19 @@
 """Database module initialisation."""
-from .common import get_engine
-from .functions import store, search, delete
+from .common import get_engine, performance_profile
+from .functions import (
+    store,
+    store_many,
+    search,
+    search_many,
+    aggregate,
+    delete,
+    delete_versions,
+    fulltext,
+    changes,
+    last_seq,
+    get_cursor,
+    set_cursor,
+)
+from .maintenance import maintain
 from .models import Base
+from .snapshot import snapshot, restore
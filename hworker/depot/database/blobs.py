@@ -0,0 +1,182 @@
+"""Content-addressed storage of Homework and Solution file bodies.
+
+Database rows of those models keep only a manifest of their content:
+Homework maps file path to (hash, timestamp), Solution maps file path to hash.
+File bodies themselves are stored once per content hash in the blob table.
+"""
+import hashlib
+import weakref
+from collections.abc import Iterable, Iterator, Mapping
+from itertools import batched
+
+import sqlalchemy
+from sqlalchemy.dialects import sqlite
+from sqlalchemy import Connection
+from sqlalchemy.orm import Session
+
+from ..objects import FileObject
+from .common import get_Session, _sqlite_max_variables
+from .models import Base, Homework, Solution, blob_table
+
+manifest_models: set[type[Base]] = {Homework, Solution}
+
+
+def content_hash(content: bytes) -> str:
+    """Get hash to address file content by
+
+    :param content: file content
+    :return: hex digest of content
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def pack(model_type: type[Base], rows: list[dict]) -> dict[str, bytes]:
+    """Replace file bodies with their hashes in rows content
+
+    :param model_type: model of the rows
+    :param rows: model column values to be stored
+    :return: file bodies by their hashes
+    """
+    found = {}
+    if model_type not in manifest_models:
+        return found
+    for row in rows:
+        manifest = {}
+        for path, file in row["content"].items():
+            if not isinstance(file, (FileObject, bytes)):
+                # already a manifest entry
+                manifest[path] = file
+                continue
+            content = file.content if model_type is Homework else file
+            found[digest := content_hash(content)] = content
+            manifest[path] = (digest, file.timestamp) if model_type is Homework else digest
+        row["content"] = manifest
+    return found
+
+
+def store(session: Session | Connection, found: dict[str, bytes]) -> None:
+    """Store file bodies that are not stored yet
+
+    :param session: session to store within
+    :param found: file bodies by their hashes
+    """
+    if found:
+        session.execute(
+            sqlite.insert(blob_table).on_conflict_do_nothing(),
+            [{"hash": digest, "content": content} for digest, content in found.items()],
+        )
+
+
+def load(session: Session | Connection, hashes: Iterable[str]) -> dict[str, bytes]:
+    """Load file bodies by their hashes
+
+    :param session: session to load within
+    :param hashes: hashes of file bodies
+    :return: file bodies by their hashes
+    """
+    found = {}
+    for chunk in batched(set(hashes), _sqlite_max_variables):
+        found |= dict(
+            session.execute(
+                sqlalchemy.select(blob_table.c.hash, blob_table.c.content).where(blob_table.c.hash.in_(chunk))
+            ).all()
+        )
+    return found
+
+
+def _referenced(model_type: type[Base], manifest: Mapping) -> Iterator[str]:
+    for value in manifest.values():
+        if not isinstance(value, (FileObject, bytes)):
+            yield value[0] if model_type is Homework else value
+
+
+def collect_garbage(session: Session | Connection) -> int:
+    """Delete file bodies no stored manifest refers to
+
+    :param session: session to delete within
+    :return: number of deleted file bodies
+    """
+    used = set()
+    for model_type in manifest_models:
+        for manifest in session.scalars(sqlalchemy.select(model_type.content)):
+            used.update(_referenced(model_type, manifest))
+    unused = [digest for digest in session.scalars(sqlalchemy.select(blob_table.c.hash)) if digest not in used]
+    for chunk in batched(unused, _sqlite_max_variables):
+        session.execute(sqlalchemy.delete(blob_table).where(blob_table.c.hash.in_(chunk)))
+    return len(unused)
+
+
+class Batch:
+    """Contents of objects found together, file bodies of all of them are loaded by one query on first file access"""
+
+    def __init__(self):
+        # contents of objects already dropped by the caller are not loaded
+        self._pending: weakref.WeakValueDictionary[int, Content] = weakref.WeakValueDictionary()
+
+    def add(self, content: "Content") -> None:
+        """Load file bodies of the content along with others
+
+        :param content: content to load
+        """
+        self._pending[id(content)] = content
+
+    def load(self) -> None:
+        """Load file bodies of every pending content"""
+        pending, self._pending = list(self._pending.values()), weakref.WeakValueDictionary()
+        with get_Session()() as session:
+            found = load(session, (digest for content in pending for digest in content._references()))
+        for content in pending:
+            content._fill(found)
+
+
+class Content(Mapping):
+    """Object content over a stored manifest, file bodies are loaded with its batch on the first file access"""
+
+    def __init__(self, model_type: type[Base], manifest: Mapping, batch: Batch = None):
+        self._model_type = model_type
+        self._manifest = manifest
+        self._files: dict | None = None
+        self._batch = batch if batch is not None else Batch()
+        self._batch.add(self)
+
+    def _references(self) -> Iterator[str]:
+        return _referenced(self._model_type, self._manifest)
+
+    def _fill(self, found: dict[str, bytes]) -> None:
+        self._files, self._batch = {}, None
+        for path, value in self._manifest.items():
+            if isinstance(value, (FileObject, bytes)):
+                # rows stored before the blob table appeared hold file bodies themselves
+                self._files[path] = value
+            elif self._model_type is Homework:
+                self._files[path] = FileObject(content=found[value[0]], timestamp=value[1])
+            else:
+                self._files[path] = found[value]
+
+    def __getitem__(self, path: str):
+        if self._files is None:
+            self._batch.load()
+        return self._files[path]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._manifest)
+
+    def __len__(self) -> int:
+        return len(self._manifest)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def unpack(model_type: type[Base], manifest: Mapping, batch: Batch = None) -> Content:
+    """Get object content from stored manifest
+
+    :param model_type: model the content belongs to
+    :param manifest: stored content
+    :param batch: batch to load file bodies with, content is loaded alone if None
+    :return: content with file bodies loaded on demand
+    """
+    return Content(model_type, manifest, batch)
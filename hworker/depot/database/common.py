@@ -1,29 +1,54 @@
+import contextlib
 import os
+import time
 from functools import cache
+from typing import Iterator
 
 from sqlalchemy import create_engine, Engine, event
 from sqlalchemy.orm import sessionmaker
 
 from .models import Base
 
-__all__ = ["get_engine", "get_Session"]
+__all__ = ["get_engine", "get_Session", "performance_profile"]
 
 from ... import config
+from ...log import get_logger
 
 _database_path = "data.db"
+# Maximum number of bound variables in one SQLite statement (for old SQLite versions)
+_sqlite_max_variables = 999
+# Name of performance profile in use, None for the configured one
+_profile: str | None = None
 
 
 def _create_database_tables(engine: Engine):
     Base.metadata.create_all(engine)
+    # create_all() skips indexes of already existing tables, so add the missing ones to old databases
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 
-@event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA journal_mode=WAL")
+    for name, value in config.get_depot_pragmas(_profile).items():
+        cursor.execute(f"PRAGMA {name}={value}")
     cursor.close()
 
 
+def _start_query(connection, cursor, statement, parameters, context, executemany):
+    # failed statements never reach after_cursor_execute, so start time lives only as long as their context
+    context.query_start = time.perf_counter()
+
+
+def _log_slow_query(connection, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context.query_start
+    threshold = config.get_depot_info().get("slow_query_threshold", 0)
+    if threshold and duration >= threshold:
+        # parameters may hold large binary values
+        get_logger(__name__).warning(f"Slow query ({duration:.3f}s): {statement} {str(parameters)[:200]}")
+
+
 @cache
 def get_engine():
     global _database_path
@@ -31,12 +56,40 @@ def get_engine():
         _database_path = config.get_depot_info()["database_path"]
     database_path = f"sqlite:///{os.path.abspath(_database_path)}"
     engine = create_engine(database_path, pool_size=10, max_overflow=40, isolation_level="AUTOCOMMIT")
+    event.listen(engine, "connect", set_sqlite_pragma)
+    event.listen(engine, "before_cursor_execute", _start_query)
+    event.listen(engine, "after_cursor_execute", _log_slow_query)
+    # pooled connections must not be shared with forked processes, they open their own ones
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
 
     _create_database_tables(engine)
+    # upgrades use functions that need this module, so import it here
+    from .migrations import upgrade
+
+    upgrade(engine)
 
     return engine
 
 
 @cache
 def get_Session():
-    return sessionmaker(get_engine())
+    # engine is in autocommit mode, so sessions need their own isolation level to make writes transactional
+    return sessionmaker(get_engine().execution_options(isolation_level="SERIALIZABLE"))
+
+
+@contextlib.contextmanager
+def performance_profile(name: str) -> Iterator[None]:
+    """Use another set of SQLite pragmas within context
+
+    :param name: profile name from depot pragmas config
+    """
+    global _profile
+    config.get_depot_pragmas(name)  # fail early on unknown profile
+    previous, _profile = _profile, name
+    # pragmas are set on connect, so drop pooled connections both ways
+    get_engine().dispose()
+    try:
+        yield
+    finally:
+        _profile = previous
+        get_engine().dispose()
@@ -0,0 +1,87 @@
+"""Transparent compression of binary column values.
+
+Values not shorter than depot "compression_threshold" config value are compressed with depot "compression" method
+and stored with a header: b"HWC" and method byte. Values that do not shrink are stored as is.
+Values without the header are read as is too, so rows stored before compression appeared keep reading.
+"""
+import lzma
+import zlib
+from typing import Callable
+
+from sqlalchemy import LargeBinary, TypeDecorator
+
+from ... import config
+
+MAGIC = b"HWC"
+_header_size = len(MAGIC) + 1
+
+
+class Method:
+    """Compression method bytes"""
+
+    NONE = 0  # uncompressed value that looks like a compressed one
+    ZLIB = 1
+    LZMA = 2
+
+
+methods: dict[str, int] = {"none": Method.NONE, "zlib": Method.ZLIB, "lzma": Method.LZMA}
+
+_compressors: dict[int, Callable[[bytes], bytes]] = {
+    Method.ZLIB: zlib.compress,
+    Method.LZMA: lzma.compress,
+}
+_decompressors: dict[int, Callable[[bytes], bytes]] = {
+    Method.NONE: bytes,
+    Method.ZLIB: zlib.decompress,
+    Method.LZMA: lzma.decompress,
+}
+
+
+def _header(method: int) -> bytes:
+    return MAGIC + bytes([method])
+
+
+def compress(value: bytes, method: str, threshold: int = 0) -> bytes:
+    """Compress value if it is worth it
+
+    :param value: value to compress
+    :param method: compression method name, one of methods
+    :param threshold: minimal size of value to compress
+    :return: value to store
+    """
+    if method not in methods:
+        raise ValueError(f"Unknown compression method {method}. Possible are {set(methods)}")
+    if methods[method] != Method.NONE and len(value) >= threshold:
+        packed = _header(methods[method]) + _compressors[methods[method]](value)
+        if len(packed) < len(value):
+            return packed
+    if value[: len(MAGIC)] == MAGIC:
+        return _header(Method.NONE) + bytes(value)
+    return value
+
+
+def decompress(value: bytes) -> bytes:
+    """Restore stored value
+
+    :param value: stored value, compressed or not
+    :return: original value
+    """
+    if value[: len(MAGIC)] != MAGIC:
+        return value
+    return _decompressors[value[len(MAGIC)]](value[_header_size:])
+
+
+class CompressedBinary(TypeDecorator):
+    """Binary column type that compresses its values"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: bytes | None, dialect) -> bytes | None:
+        if value is None:
+            return None
+        depot = config.get_depot_info()
+        return compress(value, depot.get("compression", "none"), depot.get("compression_threshold", 0))
+
+    def process_result_value(self, value: bytes | None, dialect) -> bytes | None:
+        return decompress(value) if value is not None else None
@@ -0,0 +1,106 @@
+"""Large binary values kept in files outside of the database.
+
+Values not shorter than depot "external_threshold" config value are written to a sharded directory
+next to the database file, named by their hash, while the row holds only a reference: b"HWX", version byte and digest.
+Files are compressed with depot "compression" method and read back as bytes, so large values behave
+just like small ones.
+Smaller values are compressed in the row, unless they look like a reference themselves.
+"""
+import hashlib
+import os
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+
+import sqlalchemy
+from sqlalchemy import Connection, LargeBinary, TypeDecorator
+
+from . import compression
+from .compression import CompressedBinary
+from ... import config
+
+MARK = b"HWX\x01"
+_reference_size = len(MARK) + hashlib.sha256().digest_size
+
+
+def directory() -> Path:
+    """Get directory of external values
+
+    :return: directory next to the database file
+    """
+    # database path is known only after engine creation, which precedes any value binding
+    from . import common
+
+    return Path(os.path.abspath(common._database_path)).with_suffix(".blobs")
+
+
+def _path(digest: str) -> Path:
+    return directory() / digest[:2] / digest
+
+
+def is_reference(value: bytes | None) -> bool:
+    """Check if stored value is a reference to external file"""
+    return value is not None and len(value) == _reference_size and value[: len(MARK)] == MARK
+
+
+def store(value: bytes) -> bytes:
+    """Write compressed value to external file if it is not there yet
+
+    :param value: value to store
+    :return: reference to store in the database
+    """
+    digest = hashlib.sha256(value)
+    path = _path(digest.hexdigest())
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and rename it, so partially written values are never visible
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+            file.write(compression.compress(value, config.get_depot_info().get("compression", "none")))
+        os.replace(file.name, path)
+    return MARK + digest.digest()
+
+
+def load(reference: bytes) -> bytes:
+    """Read external file
+
+    :param reference: stored reference
+    :return: original value
+    """
+    return compression.decompress(_path(reference[len(MARK) :].hex()).read_bytes())
+
+
+def collect_garbage(connection: Connection, columns: Iterable[sqlalchemy.Column]) -> int:
+    """Delete external files no stored reference points to
+
+    :param connection: connection to read references within
+    :param columns: columns that may hold references
+    :return: number of deleted files
+    """
+    if not directory().exists():
+        return 0
+    used = set()
+    for column in columns:
+        raw = sqlalchemy.type_coerce(column, LargeBinary)
+        statement = sqlalchemy.select(raw).where(sqlalchemy.func.length(raw) == _reference_size)
+        used.update(value[len(MARK) :].hex() for value in connection.scalars(statement) if is_reference(value))
+    unused = [path for path in directory().glob("*/*") if path.name not in used]
+    for path in unused:
+        path.unlink()
+    return len(unused)
+
+
+class ExternalBinary(TypeDecorator):
+    """Binary column type that compresses values and keeps large ones in external files"""
+
+    impl = CompressedBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: bytes | None, dialect) -> bytes | None:
+        threshold = config.get_depot_info().get("external_threshold", 0)
+        if value is None or (threshold <= 0 or len(value) < threshold) and not is_reference(value):
+            return value
+        # values that look like a reference are stored externally too, so they are read back as they are
+        return store(value)
+
+    def process_result_value(self, value: bytes | None, dialect) -> bytes | None:
+        return load(value) if is_reference(value) else value
@@ -0,0 +1,120 @@
+"""Compact binary encoding of file dictionaries stored in the depot.
+
+Encoded table consists of
+    - magic and format version: b"HWT" and version byte,
+    - number of entries: uint32,
+    - entry headers: name size (uint16), value kind (uint8), value size (uint32) and the name itself,
+    - entry values, one after another in the header order.
+
+Tables are decoded into plain dictionaries. Homework and Solution tables hold only file hashes,
+their file bodies are loaded on demand from the blob table.
+"""
+import pickle
+import re
+import struct
+from collections.abc import Mapping
+from typing import Any
+
+from sqlalchemy import LargeBinary, TypeDecorator
+
+MAGIC = b"HWT"
+VERSION = 1
+
+_header = struct.Struct("<3sBI")
+_entry = struct.Struct("<HBI")
+_file = struct.Struct("<32sd")
+_hash_re = re.compile(r"[0-9a-f]{64}")
+
+
+class Kind:
+    """Entry value kinds"""
+
+    BYTES = 0  # raw file content
+    TEXT = 1  # utf-8 string
+    HASH = 2  # blob hash, stored as 32 bytes of digest
+    FILE = 3  # (blob hash, timestamp) pair
+    PICKLE = 255  # anything else
+
+
+def _encode_value(value: Any) -> tuple[int, bytes]:
+    match value:
+        case bytes():
+            return Kind.BYTES, value
+        case str() if _hash_re.fullmatch(value):
+            return Kind.HASH, bytes.fromhex(value)
+        case str():
+            return Kind.TEXT, value.encode()
+        case tuple((str() as digest, int() | float() as timestamp)) if _hash_re.fullmatch(digest):
+            return Kind.FILE, _file.pack(bytes.fromhex(digest), timestamp)
+    return Kind.PICKLE, pickle.dumps(value)
+
+
+def _decode_value(kind: int, data: bytes) -> Any:
+    match kind:
+        case Kind.BYTES:
+            return data
+        case Kind.TEXT:
+            return data.decode()
+        case Kind.HASH:
+            return data.hex()
+        case Kind.FILE:
+            digest, timestamp = _file.unpack(data)
+            return digest.hex(), timestamp
+    return pickle.loads(data)
+
+
+def is_encoded(data: bytes) -> bool:
+    """Check if data is an encoded table (and not a legacy pickle)"""
+    return data[: len(MAGIC)] == MAGIC
+
+
+def encode(table: Mapping[str, Any]) -> bytes:
+    """Encode file dictionary
+
+    :param table: name: value dictionary
+    :return: encoded table
+    """
+    headers, values = [_header.pack(MAGIC, VERSION, len(table))], []
+    for name, value in table.items():
+        kind, data = _encode_value(value)
+        name = name.encode()
+        headers.append(_entry.pack(len(name), kind, len(data)) + name)
+        values.append(data)
+    return b"".join(headers + values)
+
+
+def decode(data: bytes) -> dict[str, Any]:
+    """Decode file dictionary
+
+    :param data: encoded table
+    :return: name: value dictionary
+    """
+    magic, version, count = _header.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unknown table format {magic!r} version {version}")
+    position, entries = _header.size, []
+    for _ in range(count):
+        name_size, kind, size = _entry.unpack_from(data, position)
+        position += _entry.size
+        entries.append((data[position : position + name_size].decode(), kind, size))
+        position += name_size
+    table = {}
+    for name, kind, size in entries:
+        table[name] = _decode_value(kind, data[position : position + size])
+        position += size
+    return table
+
+
+class FileTableType(TypeDecorator):
+    """Column type for file dictionaries, legacy pickled values are still readable"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Mapping | None, dialect) -> bytes | None:
+        return None if value is None else encode(value)
+
+    def process_result_value(self, value: bytes | None, dialect) -> dict | None:
+        if value is None:
+            return None
+        return decode(value) if is_encoded(value) else pickle.loads(value)
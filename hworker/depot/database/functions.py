@@ -1,17 +1,25 @@
 """Database functions"""
+import collections
 import functools
+from itertools import batched
 from operator import itemgetter
-from typing import Iterable, Optional, TypeVar
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
 
 import sqlalchemy.exc
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Session
 
 import hworker.depot.objects as objects
 from hworker.log import get_logger
-from .common import get_Session
+from .. import cache
+from . import blobs, journal, latest, textindex
+from .common import get_Session, _sqlite_max_variables
 from .models import *
 
 ObjectSuccessor = TypeVar("ObjectSuccessor", bound=objects.StoreObject)
 
+_default_yield_per = 1000
+
 _object_to_model_class: dict[type[objects.StoreObject] : type[Base]] = {
     objects.RawData: RawData,
     objects.Homework: Homework,
@@ -31,9 +39,13 @@ _model_class_to_object: dict[type[Base] : type[objects.StoreObject]] = {
     value: key for key, value in _object_to_model_class.items()
 }
 
+_table_name_to_object: dict[str, type[objects.StoreObject]] = {
+    key.__tablename__: value for key, value in _model_class_to_object.items()
+}
+
 
 def _get_fields_from_object(obj: Any):
-    return {name: value for name, value in obj.__dict__.items() if not name.startswith("_") and not callable(value)}
+    return dict(iter(obj))
 
 
 def _translate_object_to_model(obj: objects.StoreObject | type[objects.StoreObject]) -> Base:
@@ -57,6 +69,7 @@ def _create_object(
     to_parse: Base | sqlalchemy.engine.Row,
     return_type: type[objects.StoreObject],
     return_fields: list[str] = None,
+    batch: blobs.Batch = None,
 ) -> objects.StoreObject:
     if isinstance(to_parse, Base):
         fields = [item.name for item in inspect(type(to_parse)).columns]
@@ -69,24 +82,49 @@ def _create_object(
         fields = return_fields
 
     vals = {name: getattr(to_parse, name) for name in fields}
+    if "content" in vals and _object_to_model_class[return_type] in blobs.manifest_models:
+        vals["content"] = blobs.unpack(_object_to_model_class[return_type], vals["content"], batch)
 
     return return_type(**vals)
 
 
 def _parse_criteria(model: type[Base], criteria: objects.Criteria) -> BinaryExpression:
+    if criteria.condition == "or":
+        return sqlalchemy.or_(
+            *(sqlalchemy.and_(*(_parse_criteria(model, item) for item in group)) for group in criteria.field_value)
+        )
+
     model_field = getattr(model, criteria.field_name)
 
     model_method = getattr(model_field, criteria.get_condition_function())
 
-    return model_method(criteria.field_value)
-
-
-def store(obj: ObjectSuccessor) -> None:
-    """Store object into database
-    :param obj: object to store
-    """
-    get_logger(__name__).debug(f"Stored {type(obj).__name__}: {str(obj)[:100]}")
-
+    match criteria.condition:
+        case "between":
+            return model_method(*criteria.field_value)
+        case "is null" | "is not null":
+            return model_method(None)
+        case _:
+            return model_method(criteria.field_value)
+
+
+def _parameter_count(criteria: Iterable[objects.Criteria]) -> int:
+    count = 0
+    for item in criteria:
+        match item.condition:
+            case "or":
+                count += sum(_parameter_count(group) for group in item.field_value)
+            case "in" | "not in":
+                count += len(item.field_value)
+            case "between":
+                count += 2
+            case "is null" | "is not null":
+                pass
+            case _:
+                count += 1
+    return count
+
+
+def _check_object_to_store(obj: ObjectSuccessor) -> None:
     if not isinstance(obj, objects.StoreObject) or type(obj) == objects.StoreObject:
         raise ValueError("Incorrect object input")
     if obj.ID is None or obj.timestamp is None:
@@ -97,25 +135,53 @@ def store(obj: ObjectSuccessor) -> None:
             f"Found None fields in object. Please fill correct value in: {', '.join(map(itemgetter(0), none_field))}"
         )
 
-    try:
-        with get_Session().begin() as session:
-            model_obj: Base = _translate_object_to_model(obj)
-
-            if obj._is_versioned:
-                # should delete by obj.ID and obj.timestamp
-                search_result = (
-                    session.query(type(model_obj))
-                    .where(type(model_obj).ID == obj.ID, type(model_obj).timestamp == obj.timestamp)
-                    .first()
+
+@functools.cache
+def _upsert_statement(model_type: type[Base]) -> sqlalchemy.Insert:
+    statement = sqlite.insert(model_type.__table__)
+    primary_key = [column.name for column in model_type.__table__.primary_key]
+    return statement.on_conflict_do_update(
+        index_elements=primary_key,
+        set_={name: statement.excluded[name] for name in statement.excluded.keys() if name not in primary_key},
+    )
+
+
+def _write_objects(session: Session, obj_type: type[objects.StoreObject], objs: list[ObjectSuccessor]) -> None:
+    model_type = _object_to_model_class[obj_type]
+    if not obj_type._is_versioned:
+        # there must be only one object with given ID, so delete ones with other timestamps
+        for chunk in batched(objs, _sqlite_max_variables // 3):
+            session.execute(
+                sqlalchemy.delete(model_type).where(
+                    model_type.ID.in_([obj.ID for obj in chunk]),
+                    sqlalchemy.tuple_(model_type.ID, model_type.timestamp).not_in(
+                        [(obj.ID, obj.timestamp) for obj in chunk]
+                    ),
                 )
-            else:
-                # should delete by obj.ID
-                search_result = session.query(type(model_obj)).where(type(model_obj).ID == obj.ID).first()
+            )
+    rows = [_get_fields_from_object(obj) for obj in objs]
+    found = blobs.pack(model_type, rows)
+    blobs.store(session, found)
+    session.execute(_upsert_statement(model_type), rows)
+    if model_type is Solution:
+        textindex.index(session, rows, found)
+    journal.record(session, model_type, ((obj.ID, obj.timestamp) for obj in objs), "store")
+    if obj_type._is_versioned:
+        latest.advance(session, model_type, rows)
+
+
+def store(obj: ObjectSuccessor) -> None:
+    """Store object into database
+    :param obj: object to store
+    """
+    get_logger(__name__).debug(f"Stored {type(obj).__name__}: {str(obj)[:100]}")
 
-            if search_result:
-                session.delete(search_result)
+    _check_object_to_store(obj)
 
-            session.add(model_obj)
+    try:
+        with get_Session().begin() as session:
+            _write_objects(session, type(obj), [obj])
+        cache.invalidate(type(obj), obj.ID)
 
     except sqlalchemy.exc.IntegrityError:
         get_logger(__name__).debug("Failed to store object, it already exists")
@@ -123,40 +189,216 @@ def store(obj: ObjectSuccessor) -> None:
         get_logger(__name__).error(e)
 
 
+def store_many(objs: Iterable[ObjectSuccessor]) -> None:
+    """Store a batch of objects into database within one transaction
+    :param objs: objects to store, later objects replace earlier ones just like in sequential store() calls
+    """
+    objs = list(objs)
+    get_logger(__name__).debug(f"Stored {len(objs)} objects in batch")
+
+    for obj in objs:
+        _check_object_to_store(obj)
+
+    # versioned objects are replaced by ID and timestamp, other ones by ID only
+    grouped: dict[type[objects.StoreObject], dict[tuple, ObjectSuccessor]] = {}
+    for obj in objs:
+        key = (obj.ID, obj.timestamp) if obj.is_versioned() else (obj.ID,)
+        grouped.setdefault(type(obj), {})[key] = obj
+
+    try:
+        with get_Session().begin() as session:
+            for obj_type, group in grouped.items():
+                _write_objects(session, obj_type, list(group.values()))
+        for obj_type, group in grouped.items():
+            for obj in group.values():
+                cache.invalidate(obj_type, obj.ID)
+
+    except sqlalchemy.exc.IntegrityError:
+        get_logger(__name__).debug("Failed to store objects, some of them already exist")
+    except Exception as e:
+        get_logger(__name__).error(e)
+
+
+def _search_statement(
+    model_type: type[Base],
+    criteria: Iterable[objects.Criteria],
+    return_fields: list[str] | None,
+    actual: bool,
+    *restrictions: sqlalchemy.ColumnElement[bool],
+    as_of: float | None = None,
+) -> sqlalchemy.Select:
+    # restrictions are extra conditions on version-invariant fields only
+    columns = inspect(model_type).columns
+    if return_fields is not None and not all(name in columns for name in return_fields):
+        raise ValueError("Requested field not found in object")
+
+    conditions = list(map(functools.partial(_parse_criteria, model_type), criteria)) + list(restrictions)
+    if as_of is not None:
+        # the newest version not later than the moment was the actual one at that moment
+        conditions.append(model_type.timestamp <= as_of)
+        actual = True
+    # query only requested columns, so heavy ones are not even read unless needed
+    selected = [getattr(model_type, name) for name in (return_fields or columns.keys())]
+    statement = sqlalchemy.select(*selected).order_by(model_type.timestamp.desc())
+
+    if actual and _model_class_to_object[model_type]._is_versioned:
+        if as_of is None and all(item.field_names() <= latest.invariant_fields for item in criteria):
+            # criteria match all versions of an object or none of them, so latest version pointer can be used
+            statement = latest.join(statement, model_type).where(*conditions)
+        else:
+            # find latest timestamp of every matching ID, then join the rows back by primary key
+            newest = (
+                sqlalchemy.select(model_type.ID, sqlalchemy.func.max(model_type.timestamp).label("timestamp"))
+                .where(*conditions)
+                .group_by(model_type.ID)
+                .subquery()
+            )
+            statement = statement.join(
+                newest, sqlalchemy.and_(model_type.ID == newest.c.ID, model_type.timestamp == newest.c.timestamp)
+            )
+    elif len(conditions) != 0:
+        statement = statement.where(*conditions)
+
+    return statement
+
+
+def _stream(
+    statement: sqlalchemy.Select, translator: Callable[[sqlalchemy.Row], ObjectSuccessor], yield_per: int
+) -> Iterator[ObjectSuccessor]:
+    # session lives as long as the generator: till it is exhausted, closed or garbage collected
+    with get_Session()() as session:
+        for partition in session.execute(statement, execution_options={"yield_per": yield_per}).partitions():
+            # file bodies of objects fetched at once are loaded at once too
+            batch = blobs.Batch()
+            found = collections.deque(translator(row, batch=batch) for row in partition)
+            while found:
+                yield found.popleft()
+
+
 def search(
     obj_type: type[objects.StoreObject],
     *criteria: objects.Criteria,
     return_fields: list[str] = None,
     first: bool = False,
     actual: bool = False,
-) -> Iterable[ObjectSuccessor] | Optional[ObjectSuccessor]:
+    as_of: float = None,
+    yield_per: int = _default_yield_per,
+) -> Iterator[ObjectSuccessor] | Optional[ObjectSuccessor]:
     """Search for object in database
     :param obj_type: type of object to search
     :param criteria: criteria for searching
     :param return_fields: filter for return fields
     :param first: return only first elem
     :param actual: return only latest version of object (grouping them by id)
-    :return: iterator for found objects
+    :param as_of: return only latest version of object not later than this timestamp
+    :param yield_per: number of rows fetched from database at once
+    :return: generator of found objects, that holds database session until exhausted or closed
     """
     get_logger(__name__).debug(f"Searched for {obj_type.__name__}")
 
     model_type = type(_translate_object_to_model(obj_type))
-    with get_Session()() as session:
-        search_result = session.query(model_type).order_by(model_type.timestamp.desc())
+    statement = _search_statement(model_type, criteria, return_fields, actual, as_of=as_of)
+    translator = functools.partial(_create_object, return_type=obj_type, return_fields=return_fields)
 
-        if len(criteria) != 0:
-            search_result = search_result.filter(*list(map(functools.partial(_parse_criteria, model_type), criteria)))
+    if first:
+        key = cache.lookup_key(obj_type, criteria) if return_fields is None and as_of is None else None
+        if key is not None and (cached := cache.get(key)) is not cache.missing:
+            return cached
+        with get_Session()() as session:
+            found = session.execute(statement.limit(1)).first()
+            found = None if found is None else translator(found)
+        if key is not None:
+            cache.put(key, found)
+        return found
 
-        if actual and obj_type().is_versioned():
-            # wrap base query and subquery and then execute group_by on it for getting most old object
-            search_result = session.query(search_result.subquery()).group_by("ID")
+    return _stream(statement, translator, yield_per)
 
-        translator = functools.partial(_create_object, return_type=obj_type, return_fields=return_fields)
 
-        if first:
-            return None if search_result.first() is None else translator(search_result.first())
+def search_many(
+    obj_type: type[objects.StoreObject],
+    ids: Iterable[str],
+    *criteria: objects.Criteria,
+    return_fields: list[str] = None,
+    actual: bool = True,
+) -> dict[str, ObjectSuccessor] | dict[str, list[ObjectSuccessor]]:
+    """Search for objects with given IDs in database
+    :param obj_type: type of objects to search
+    :param ids: IDs of objects
+    :param criteria: additional criteria for searching
+    :param return_fields: filter for return fields, ID is always returned
+    :param actual: return only latest version of objects, all versions otherwise
+    :return: found objects by ID, lists of versions (latest first) for versioned objects if not actual
+    """
+    ids = list(dict.fromkeys(ids))
+    get_logger(__name__).debug(f"Searched for {len(ids)} {obj_type.__name__} objects")
+
+    model_type = _object_to_model_class[obj_type]
+    if return_fields is not None and "ID" not in return_fields:
+        return_fields = ["ID", *return_fields]
+    translator = functools.partial(_create_object, return_type=obj_type, return_fields=return_fields)
+
+    found, cached = {}, cache.is_enabled() and actual and not criteria and return_fields is None
+    if cached:
+        # plain lookups by ID are shared with search(..., first=True) cache
+        for ID in ids:
+            if (obj := cache.get((obj_type, ID))) is not cache.missing:
+                found[ID] = obj
+        ids = [ID for ID in ids if ID not in found]
 
-        return map(translator, search_result)
+    with get_Session()() as session:
+        # leave room for criteria values and latest version table name
+        for chunk in batched(ids, _sqlite_max_variables - _parameter_count(criteria) - 1):
+            statement = _search_statement(model_type, criteria, return_fields, actual, model_type.ID.in_(chunk))
+            batch = blobs.Batch()
+            for row in session.execute(statement):
+                obj = translator(row, batch=batch)
+                if actual or not obj_type._is_versioned:
+                    found.setdefault(obj.ID, obj)
+                else:
+                    found.setdefault(obj.ID, []).append(obj)
+
+    if cached:
+        for ID in ids:
+            cache.put((obj_type, ID), found.get(ID))
+    return {ID: obj for ID, obj in found.items() if obj is not None}
+
+
+def aggregate(
+    obj_type: type[objects.StoreObject],
+    *criteria: objects.Criteria,
+    group_by: list[str] = None,
+    metrics: dict[str, str],
+    actual: bool = False,
+) -> list[dict[str, Any]]:
+    """Aggregate object fields in database
+    :param obj_type: type of objects to aggregate
+    :param criteria: criteria for searching
+    :param group_by: fields to group objects by, all found objects are one group if None
+    :param metrics: field name: aggregate function (one of objects.aggregate_functions) dict, fields not grouped by
+    :param actual: aggregate only latest versions of objects
+    :return: list of group field and metric values dictionaries
+    """
+    get_logger(__name__).debug(f"Aggregated {obj_type.__name__}")
+
+    group_by = group_by or []
+    if any(function not in objects.aggregate_functions for function in metrics.values()):
+        raise ValueError(f"Unknown aggregate function. Possible are {objects.aggregate_functions}")
+    if grouped := set(group_by) & set(metrics):
+        raise ValueError(f"Fields {sorted(grouped)} can not be both grouped by and aggregated")
+
+    model_type = _object_to_model_class[obj_type]
+    found = (
+        _search_statement(model_type, criteria, list(dict.fromkeys(group_by + list(metrics))), actual)
+        .order_by(None)
+        .subquery()
+    )
+    statement = sqlalchemy.select(
+        *(found.c[name] for name in group_by),
+        *(getattr(sqlalchemy.func, function)(found.c[name]).label(name) for name, function in metrics.items()),
+    ).group_by(*(found.c[name] for name in group_by))
+
+    with get_Session()() as session:
+        return [row._asdict() for row in session.execute(statement)]
 
 
 def delete(obj_type: type[objects.StoreObject], *criteria: objects.Criteria) -> None:
@@ -169,8 +411,106 @@ def delete(obj_type: type[objects.StoreObject], *criteria: objects.Criteria) ->
 
     model_type = type(_translate_object_to_model(obj_type))
     with get_Session().begin() as session:
-        search_result = session.query(model_type)
-        if len(criteria) != 0:
-            search_result = search_result.filter(*list(map(functools.partial(_parse_criteria, model_type), criteria)))
+        deleted = session.execute(
+            sqlalchemy.delete(model_type)
+            .where(*map(functools.partial(_parse_criteria, model_type), criteria))
+            .returning(model_type.ID, model_type.timestamp)
+        ).all()
+        journal.record(session, model_type, deleted, "delete")
+        if model_type is Solution:
+            textindex.drop(session, deleted)
+        if _model_class_to_object[model_type]._is_versioned:
+            latest.refresh(session, model_type)
+    cache.invalidate(_model_class_to_object[model_type])
+
+
+def delete_versions(obj_type: type[objects.StoreObject], versions: Iterable[tuple[str, float]]) -> None:
+    """Delete given versions of objects from database
+    :param obj_type: type of objects to delete
+    :param versions: (ID, timestamp) pairs of objects to delete
+    """
+    versions = list(versions)
+    get_logger(__name__).debug(f"Deleted {len(versions)} versions of {obj_type.__name__}")
+
+    model_type = _object_to_model_class[obj_type]
+    with get_Session().begin() as session:
+        for chunk in batched(versions, _sqlite_max_variables // 2):
+            deleted = session.execute(
+                sqlalchemy.delete(model_type)
+                .where(sqlalchemy.tuple_(model_type.ID, model_type.timestamp).in_(chunk))
+                .returning(model_type.ID, model_type.timestamp)
+            ).all()
+            journal.record(session, model_type, deleted, "delete")
+            if model_type is Solution:
+                textindex.drop(session, deleted)
+        if obj_type._is_versioned:
+            latest.refresh(session, model_type)
+    cache.invalidate(obj_type)
+
+
+def fulltext(query: str, task: str = None, actual: bool = True) -> list[objects.FileMatch]:
+    """Find solution files by their text
+    :param query: SQLite FTS5 query: words (identifiers included) joined with AND, OR, NOT, "phrases" or prefix* ones
+    :param task: find only solutions of this task
+    :param actual: find only latest versions of solutions
+    :return: matching files, latest solution versions first
+    """
+    get_logger(__name__).debug(f"Searched solutions for {query!r}")
 
-        search_result.delete()
+    with get_Session()() as session:
+        return textindex.search(session, query, task, actual)
+
+
+def changes(since: int = 0, types: Iterable[type[objects.StoreObject]] = None) -> list[objects.Change]:
+    """Get journal of object versions stored or deleted after given sequence number
+    :param since: last processed sequence number, 0 for the whole journal
+    :param types: types of objects to get changes of, all types if None
+    :return: changes in order they were made
+    """
+    statement = sqlalchemy.select(journal_table).where(journal_table.c.seq > since).order_by(journal_table.c.seq)
+    if types is not None:
+        statement = statement.where(
+            journal_table.c.table_name.in_([_object_to_model_class[obj_type].__tablename__ for obj_type in types])
+        )
+    with get_Session()() as session:
+        return [
+            objects.Change(row.seq, _table_name_to_object[row.table_name], row.ID, row.timestamp, row.op)
+            for row in session.execute(statement)
+        ]
+
+
+def last_seq() -> int:
+    """Get sequence number of the latest journal record, trimmed ones included
+    :return: sequence number, 0 if nothing was journaled yet
+    """
+    with get_Session()() as session:
+        # autoincrement table keeps the largest sequence number ever used
+        statement = sqlalchemy.text("SELECT seq FROM sqlite_sequence WHERE name = :name")
+        return session.scalar(statement, {"name": journal_table.name}) or 0
+
+
+def get_cursor(consumer: str) -> int:
+    """Get last journal sequence number processed by consumer
+    :param consumer: consumer name
+    :return: sequence number, 0 if consumer has processed nothing yet
+    """
+    with get_Session()() as session:
+        return session.scalar(sqlalchemy.select(cursor_table.c.seq).where(cursor_table.c.consumer == consumer)) or 0
+
+
+def set_cursor(consumer: str, seq: int, types: Iterable[type[objects.StoreObject]] = None) -> None:
+    """Remember last journal sequence number processed by consumer
+    :param consumer: consumer name
+    :param seq: sequence number
+    :param types: types of objects consumer reads changes of, all types if None
+    """
+    table_names = (
+        None if types is None else sorted(_object_to_model_class[obj_type].__tablename__ for obj_type in types)
+    )
+    statement = sqlite.insert(cursor_table).values(consumer=consumer, seq=seq, table_names=table_names)
+    with get_Session().begin() as session:
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["consumer"], set_={"seq": seq, "table_names": statement.excluded.table_names}
+            )
+        )
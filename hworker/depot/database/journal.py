@@ -0,0 +1,72 @@
+"""Journal of stored and deleted object versions.
+
+Every write appends (seq, table name, ID, timestamp, operation) records to the journal table within the same
+transaction, so consumers (parse, check, score, publish) can ask for changes since the last sequence number
+they have processed. Consumer cursors are kept in the cursor table.
+"""
+from collections.abc import Iterable
+
+import sqlalchemy
+from sqlalchemy import Connection
+from sqlalchemy.orm import Session
+
+from .models import Base, cursor_table, journal_table
+
+
+def record(
+    session: Session | Connection, model_type: type[Base], versions: Iterable[tuple[str, float]], op: str
+) -> None:
+    """Append changed object versions to the journal
+
+    :param session: session to write within
+    :param model_type: model of changed rows
+    :param versions: (ID, timestamp) pairs of changed rows
+    :param op: operation, one of objects.change_operations
+    """
+    rows = [
+        {"table_name": model_type.__tablename__, "ID": ID, "timestamp": timestamp, "op": op}
+        for ID, timestamp in versions
+    ]
+    if rows:
+        session.execute(sqlalchemy.insert(journal_table), rows)
+
+
+def fill(session: Session | Connection, model_type: type[Base]) -> None:
+    """Journal all stored rows as stored, oldest first
+
+    :param session: session to write within
+    :param model_type: model to journal rows of
+    """
+    session.execute(
+        sqlalchemy.insert(journal_table).from_select(
+            ["table_name", "ID", "timestamp", "op"],
+            sqlalchemy.select(
+                sqlalchemy.literal(model_type.__tablename__),
+                model_type.ID,
+                model_type.timestamp,
+                sqlalchemy.literal("store"),
+            ).order_by(model_type.timestamp, model_type.ID),
+        )
+    )
+
+
+def trim(session: Session | Connection) -> int:
+    """Delete records of every table that all the consumers reading the table have already processed
+
+    Records of tables nobody reads are deleted as well, so a new consumer starts with a full pass over stored objects
+    and then reads changes since last_seq() taken before that pass.
+
+    :param session: session to delete within
+    :return: number of deleted records
+    """
+    processed: dict[str, int] = {}
+    for seq, table_names in session.execute(sqlalchemy.select(cursor_table.c.seq, cursor_table.c.table_names)):
+        for name in table_names if table_names is not None else Base.metadata.tables:
+            processed[name] = min(seq, processed.get(name, seq))
+    unread = session.execute(sqlalchemy.delete(journal_table).where(journal_table.c.table_name.not_in(processed)))
+    return unread.rowcount + sum(
+        session.execute(
+            sqlalchemy.delete(journal_table).where(journal_table.c.table_name == name, journal_table.c.seq <= seq)
+        ).rowcount
+        for name, seq in processed.items()
+    )
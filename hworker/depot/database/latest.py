@@ -0,0 +1,102 @@
+"""Pointers to the latest versions of versioned objects.
+
+Every versioned model row with the greatest timestamp of its ID is referenced from the latest_version table,
+so searching for actual objects is a primary key join instead of grouping all the versions.
+"""
+from itertools import batched
+
+import sqlalchemy
+from sqlalchemy import Connection
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Session
+
+from .common import _sqlite_max_variables
+from .models import Base, latest_version_table
+
+# fields that are the same for all versions of an object, so filtering by them does not change the latest version
+invariant_fields: set[str] = {"ID", "USER_ID", "TASK_ID"}
+
+
+def advance(session: Session | Connection, model_type: type[Base], rows: list[dict]) -> None:
+    """Move latest version pointers forward to stored rows, if they are newer
+
+    :param session: session to store within
+    :param model_type: model of the rows
+    :param rows: model column values being stored
+    """
+    newest: dict[str, float] = {}
+    for row in rows:
+        newest[row["ID"]] = max(row["timestamp"], newest.get(row["ID"], row["timestamp"]))
+    if not newest:
+        return
+    statement = sqlite.insert(latest_version_table)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["table_name", "ID"],
+            set_={"timestamp": statement.excluded.timestamp},
+            where=statement.excluded.timestamp > latest_version_table.c.timestamp,
+        ),
+        [{"table_name": model_type.__tablename__, "ID": ID, "timestamp": ts} for ID, ts in newest.items()],
+    )
+
+
+def refresh(session: Session | Connection, model_type: type[Base]) -> None:
+    """Repoint latest versions whose rows are deleted to the remaining newest ones
+
+    :param session: session to update within
+    :param model_type: model which rows were deleted
+    """
+    latest = latest_version_table
+    name = model_type.__tablename__
+    dangling = session.scalars(
+        sqlalchemy.select(latest.c.ID).where(
+            latest.c.table_name == name,
+            ~sqlalchemy.exists().where(model_type.ID == latest.c.ID, model_type.timestamp == latest.c.timestamp),
+        )
+    ).all()
+    for chunk in batched(dangling, _sqlite_max_variables):
+        session.execute(sqlalchemy.delete(latest).where(latest.c.table_name == name, latest.c.ID.in_(chunk)))
+        session.execute(
+            sqlalchemy.insert(latest).from_select(
+                ["table_name", "ID", "timestamp"],
+                sqlalchemy.select(sqlalchemy.literal(name), model_type.ID, sqlalchemy.func.max(model_type.timestamp))
+                .where(model_type.ID.in_(chunk))
+                .group_by(model_type.ID),
+            )
+        )
+
+
+def fill(session: Session | Connection, model_type: type[Base]) -> None:
+    """Build latest version pointers of all stored rows from scratch
+
+    :param session: session to update within
+    :param model_type: model to build pointers for
+    """
+    latest = latest_version_table
+    session.execute(sqlalchemy.delete(latest).where(latest.c.table_name == model_type.__tablename__))
+    session.execute(
+        sqlalchemy.insert(latest).from_select(
+            ["table_name", "ID", "timestamp"],
+            sqlalchemy.select(
+                sqlalchemy.literal(model_type.__tablename__), model_type.ID, sqlalchemy.func.max(model_type.timestamp)
+            ).group_by(model_type.ID),
+        )
+    )
+
+
+def join(statement: sqlalchemy.Select, model_type: type[Base]) -> sqlalchemy.Select:
+    """Restrict statement to the latest versions of objects
+
+    :param statement: select statement over model
+    :param model_type: model of the statement
+    :return: statement joined with latest version pointers
+    """
+    latest = latest_version_table
+    return statement.join(
+        latest,
+        sqlalchemy.and_(
+            latest.c.table_name == model_type.__tablename__,
+            latest.c.ID == model_type.ID,
+            latest.c.timestamp == model_type.timestamp,
+        ),
+    )
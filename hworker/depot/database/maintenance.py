@@ -0,0 +1,56 @@
+"""Database housekeeping: garbage collection, statistics and compaction."""
+import sqlalchemy.exc
+
+from hworker.log import get_logger
+from . import blobs, external, journal, textindex
+from .common import get_engine, get_Session
+from .models import Base
+
+
+def _table_sizes(connection: sqlalchemy.Connection) -> dict[str, int | None]:
+    try:
+        # dbstat counts every b-tree, so indexes are added to their tables
+        sizes = connection.exec_driver_sql(
+            "SELECT schema.tbl_name, sum(dbstat.pgsize) FROM dbstat JOIN sqlite_schema AS schema "
+            "ON schema.name = dbstat.name GROUP BY schema.tbl_name"
+        ).all()
+    except sqlalchemy.exc.OperationalError:
+        # SQLite is built without dbstat virtual table
+        return {}
+    return dict(sizes)
+
+
+def maintain() -> dict[str, tuple[int, int | None]]:
+    """Drop unused file bodies and processed journal, refresh planner statistics, checkpoint and compact the database
+
+    :return: table name: (number of rows, size in bytes or None if unknown) report
+    """
+    with get_Session().begin() as session:
+        collected = blobs.collect_garbage(session)
+        unindexed = textindex.collect_garbage(session)
+        trimmed = journal.trim(session)
+    get_logger(__name__).info(
+        f"Deleted {collected} unused file bodies, {unindexed} unused indexed texts and {trimmed} processed journal records"
+    )
+    with get_engine().connect() as connection:
+        columns = [
+            column
+            for table in Base.metadata.tables.values()
+            for column in table.columns
+            if isinstance(column.type, external.ExternalBinary)
+        ]
+        collected = external.collect_garbage(connection, columns)
+    get_logger(__name__).info(f"Deleted {collected} unused external files")
+
+    with get_engine().connect() as connection:
+        connection.exec_driver_sql("ANALYZE")
+        connection.exec_driver_sql("VACUUM")
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        sizes = _table_sizes(connection)
+        return {
+            name: (
+                connection.execute(sqlalchemy.select(sqlalchemy.func.count()).select_from(table)).scalar(),
+                sizes.get(name),
+            )
+            for name, table in Base.metadata.tables.items()
+        }
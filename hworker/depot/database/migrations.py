@@ -0,0 +1,98 @@
+"""One-shot upgrades of existing depot databases.
+
+Database schema version is kept in SQLite "user_version" pragma,
+each upgrade is performed once when the database is opened for the first time after it.
+"""
+import pickle
+from itertools import batched
+
+import sqlalchemy
+from sqlalchemy import Connection, Engine
+
+from . import blobs, filetable, journal, latest, textindex
+from .common import _sqlite_max_variables
+from .models import Base, Homework, Check, Solution
+from .. import objects
+from ...log import get_logger
+
+_file_table_columns: dict[type[Base], list[str]] = {
+    Homework: ["content"],
+    Check: ["content"],
+    Solution: ["content", "checks"],
+}
+
+
+def _encode_file_tables(connection: Connection) -> None:
+    """Re-encode pickled file dictionaries into file tables, moving file bodies into blob table"""
+    for model_type, names in _file_table_columns.items():
+        table = model_type.__table__
+        raw_columns = [sqlalchemy.type_coerce(table.c[name], sqlalchemy.LargeBinary).label(name) for name in names]
+        keys = connection.execute(sqlalchemy.select(table.c.ID, table.c.timestamp)).all()
+        for chunk in batched(keys, _sqlite_max_variables // 2):
+            rows = connection.execute(
+                sqlalchemy.select(table.c.ID, table.c.timestamp, *raw_columns).where(
+                    sqlalchemy.tuple_(table.c.ID, table.c.timestamp).in_(chunk)
+                )
+            ).all()
+            for row in rows:
+                values = {name: getattr(row, name) for name in names}
+                if all(value is None or filetable.is_encoded(value) for value in values.values()):
+                    continue
+                values = {
+                    name: filetable.decode(value) if filetable.is_encoded(value) else pickle.loads(value)
+                    for name, value in values.items()
+                    if value is not None
+                }
+                blobs.store(connection, blobs.pack(model_type, [values]))
+                connection.execute(
+                    sqlalchemy.update(table)
+                    .where(table.c.ID == row.ID, table.c.timestamp == row.timestamp)
+                    .values(**values)
+                )
+
+
+def _fill_latest_versions(connection: Connection) -> None:
+    """Build latest version pointers of versioned objects"""
+    for model_type in Base.__subclasses__():
+        if getattr(objects, model_type.__name__)._is_versioned:
+            latest.fill(connection, model_type)
+
+
+def _journal_stored_objects(connection: Connection) -> None:
+    """Journal already stored objects, so consumers starting from scratch see them"""
+    for model_type in Base.__subclasses__():
+        journal.fill(connection, model_type)
+
+
+def _index_solution_sources(connection: Connection) -> None:
+    """Build full-text index of stored solution files"""
+    textindex.fill(connection)
+
+
+def _add_cursor_table_names(connection: Connection) -> None:
+    """Add names of tables read by journal consumers"""
+    if "table_names" not in {row.name for row in connection.exec_driver_sql("PRAGMA table_info(cursor)")}:
+        connection.exec_driver_sql("ALTER TABLE cursor ADD COLUMN table_names JSON")
+
+
+_upgrades = [
+    _encode_file_tables,
+    _fill_latest_versions,
+    _journal_stored_objects,
+    _index_solution_sources,
+    _add_cursor_table_names,
+]
+
+
+def upgrade(engine: Engine) -> None:
+    """Perform all the upgrades newer than database schema version
+
+    :param engine: engine of the database
+    """
+    with engine.execution_options(isolation_level="SERIALIZABLE").begin() as connection:
+        version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+        for number, upgrade_function in enumerate(_upgrades[version:], start=version + 1):
+            get_logger(__name__).debug(f"Upgrading database to version {number}: {upgrade_function.__doc__}")
+            upgrade_function(connection)
+        if version < len(_upgrades):
+            connection.exec_driver_sql(f"PRAGMA user_version = {len(_upgrades)}")
@@ -2,8 +2,11 @@
 import datetime
 
 from sqlalchemy import *
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy import event
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, declared_attr
 
+from .external import ExternalBinary
+from .filetable import FileTableType
 from ..objects import CheckCategoryEnum, VerdictEnum
 
 _default_datetime = datetime.datetime.fromisoformat("2009-05-17 20:09:00")
@@ -17,6 +20,18 @@ class Base(DeclarativeBase):
     TASK_ID: Mapped[str] = mapped_column(String, nullable=False)
     timestamp: Mapped[float] = mapped_column(Float, primary_key=True, nullable=False)
 
+    # additional (column names, ...) indexes of particular model
+    _extra_indexes = ()
+
+    @declared_attr.directive
+    def __table_args__(cls) -> tuple:
+        """Indexes for object versions lookup, user/task filtering and extra model-specific ones"""
+        return (
+            Index(f"ix_{cls.__tablename__}_versions", "ID", text("timestamp DESC")),
+            Index(f"ix_{cls.__tablename__}_user_task", "USER_ID", "TASK_ID", text("timestamp DESC")),
+            *(Index(f"ix_{cls.__tablename__}_{'_'.join(columns)}", *columns) for columns in cls._extra_indexes),
+        )
+
     # noinspection PyTypeChecker
     def __init__(self, ID: str = None, USER_ID: str = None, TASK_ID: str = None, timestamp: int = None, **kwargs):
         """Initialise base object"""
@@ -27,10 +42,72 @@ class Base(DeclarativeBase):
         self.timestamp = timestamp
 
 
+# Deduplicated file bodies of Homework and Solution objects, keyed by content hash
+blob_table = Table(
+    "blob",
+    Base.metadata,
+    Column("hash", String, primary_key=True),
+    Column("content", ExternalBinary, nullable=False),
+)
+
+# Timestamp of the latest version of every versioned object, keyed by object table name and ID
+latest_version_table = Table(
+    "latest_version",
+    Base.metadata,
+    Column("table_name", String, primary_key=True),
+    Column("ID", String, primary_key=True),
+    Column("timestamp", Float, nullable=False),
+)
+
+# Stored and deleted object versions in order, so consumers can process only what changed since their cursor
+journal_table = Table(
+    "journal",
+    Base.metadata,
+    Column("seq", Integer, primary_key=True),
+    Column("table_name", String, nullable=False),
+    Column("ID", String, nullable=False),
+    Column("timestamp", Float, nullable=False),
+    Column("op", String, nullable=False),
+    Index("ix_journal_table_name_seq", "table_name", "seq"),
+    # sequence numbers are never reused, even when the journal is trimmed
+    sqlite_autoincrement=True,
+)
+
+# Text files of every solution version, pointing to their full-text index rows
+solution_file_table = Table(
+    "solution_file",
+    Base.metadata,
+    Column("ID", String, primary_key=True),
+    Column("timestamp", Float, primary_key=True),
+    Column("path", String, primary_key=True),
+    Column("USER_ID", String, nullable=False),
+    Column("TASK_ID", String, nullable=False),
+    Column("text_id", Integer, nullable=False),
+    Index("ix_solution_file_text_id", "text_id"),
+)
+
+# SQLite FTS5 full-text index of solution file texts, one row per distinct text, see textindex module
+solution_text_table = table("solution_text", column("rowid", Integer), column("content", String))
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL("CREATE VIRTUAL TABLE IF NOT EXISTS solution_text USING fts5(content, tokenize=\"unicode61 tokenchars '_'\")"),
+)
+
+# Last processed journal sequence number of every consumer, and names of tables it reads (all if NULL)
+cursor_table = Table(
+    "cursor",
+    Base.metadata,
+    Column("consumer", String, primary_key=True),
+    Column("seq", Integer, nullable=False),
+    Column("table_names", JSON),
+)
+
+
 class RawData(Base):
     __tablename__ = "rawdata"
 
-    content: Mapped[bytes] = mapped_column(LargeBinary)
+    content: Mapped[bytes] = mapped_column(ExternalBinary)
 
     # noinspection PyTypeChecker
     def __init__(self, content: bytes = None, **kwargs):
@@ -41,7 +118,7 @@ class RawData(Base):
 class Homework(Base):
     __tablename__ = "homework"
 
-    content: Mapped[dict] = mapped_column(PickleType)
+    content: Mapped[dict] = mapped_column(FileTableType)
     is_broken: Mapped[bool] = mapped_column(Boolean)
 
     # noinspection PyTypeChecker
@@ -54,7 +131,7 @@ class Homework(Base):
 class Check(Base):
     __tablename__ = "check"
 
-    content: Mapped[dict] = mapped_column(PickleType)
+    content: Mapped[dict] = mapped_column(FileTableType)
     category: Mapped[CheckCategoryEnum] = mapped_column(Enum(CheckCategoryEnum))
 
     # noinspection PyTypeChecker
@@ -66,9 +143,10 @@ class Check(Base):
 
 class Solution(Base):
     __tablename__ = "solution"
+    _extra_indexes = (("TASK_ID", "ID", "timestamp"),)
 
-    content: Mapped[dict] = mapped_column(PickleType)
-    checks: Mapped[dict] = mapped_column(PickleType)
+    content: Mapped[dict] = mapped_column(FileTableType)
+    checks: Mapped[dict] = mapped_column(FileTableType)
 
     # noinspection PyTypeChecker
     def __init__(self, content: dict = None, checks: dict = None, **kwargs):
@@ -79,6 +157,7 @@ class Solution(Base):
 
 class CheckResult(Base):
     __tablename__ = "check_result"
+    _extra_indexes = (("ID", "solution_timestamp", "check_timestamp"),)
 
     rating: Mapped[float] = mapped_column(Float)
     category: Mapped[CheckCategoryEnum] = mapped_column(Enum(CheckCategoryEnum))
@@ -87,8 +166,8 @@ class CheckResult(Base):
     solution_ID: Mapped[str] = mapped_column(String)
     solution_timestamp: Mapped[float] = mapped_column(Float)
     verdict: Mapped[VerdictEnum] = mapped_column(Enum(VerdictEnum))
-    stdout: Mapped[bytes] = mapped_column(LargeBinary)
-    stderr: Mapped[bytes] = mapped_column(LargeBinary)
+    stdout: Mapped[bytes] = mapped_column(ExternalBinary)
+    stderr: Mapped[bytes] = mapped_column(ExternalBinary)
 
     # noinspection PyTypeChecker
     def __init__(
@@ -131,6 +210,7 @@ class TaskQualifier(Base):
 
 class TaskScore(Base):
     __tablename__ = "task_score"
+    _extra_indexes = (("USER_ID", "TASK_ID", "name", "rating"),)
 
     name: Mapped[str] = mapped_column(String)
     rating: Mapped[float] = mapped_column(Float)
@@ -157,6 +237,7 @@ class UserQualifier(Base):
 
 class UserScore(Base):
     __tablename__ = "user_score"
+    _extra_indexes = (("USER_ID", "TASK_ID", "name", "rating"),)
 
     name: Mapped[str] = mapped_column(String)
     rating: Mapped[float] = mapped_column(Float)
@@ -183,6 +264,7 @@ class Formula(Base):
 
 class FinalScore(Base):
     __tablename__ = "final_score"
+    _extra_indexes = (("USER_ID", "TASK_ID", "name", "rating"),)
 
     name: Mapped[str] = mapped_column(String)
     rating: Mapped[str] = mapped_column(String)
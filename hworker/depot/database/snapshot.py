@@ -0,0 +1,131 @@
+"""Depot snapshots: consistent online backups packed into a single compressed archive.
+
+The archive is a tar file, compressed after depot "compression" config value, containing
+    - manifest.json: format, creation time, schema version, row count of every table and hash of every file,
+    - depot.db: copy of the database made with SQLite backup API, so it is consistent even while the depot is in use,
+    - blobs/...: external files of large values.
+"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+from pathlib import Path
+
+from .. import cache
+from . import external
+from .common import get_engine, _create_database_tables
+from .functions import _object_to_model_class
+from .models import Base
+from ... import config
+
+FORMAT = 1
+_manifest_name = "manifest.json"
+_database_name = "depot.db"
+_blobs_name = "blobs"
+_archive_modes: dict[str, str] = {"none": "", "zlib": "gz", "lzma": "xz"}
+_chunk_size = 1 << 20
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        while chunk := file.read(_chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _row_counts(connection: sqlite3.Connection) -> dict[str, int]:
+    existing = {name for (name,) in connection.execute("SELECT name FROM sqlite_schema WHERE type = 'table'")}
+    return {
+        name: connection.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+        for name in Base.metadata.tables
+        if name in existing
+    }
+
+
+def _copy_missing(source: str, destination: str) -> None:
+    # files with the same name keep the same value, so existing ones are kept as they are
+    if not os.path.exists(destination):
+        shutil.copy2(source, destination)
+
+
+def snapshot(path: str | Path) -> dict:
+    """Write consistent copy of the depot to a compressed archive
+
+    :param path: archive path
+    :return: archive manifest
+    """
+    path = Path(path)
+    with tempfile.TemporaryDirectory(dir=path.parent) as directory:
+        copy = Path(directory) / _database_name
+        with get_engine().connect() as connection, sqlite3.connect(copy) as target:
+            connection.connection.driver_connection.backup(target)
+            manifest = {
+                "format": FORMAT,
+                "created": datetime.datetime.now().timestamp(),
+                "schema_version": target.execute("PRAGMA user_version").fetchone()[0],
+                "tables": _row_counts(target),
+                "files": {_database_name: _file_hash(copy)},
+            }
+        target.close()
+        blobs = sorted(external.directory().glob("*/*")) if external.directory().exists() else []
+        for blob in blobs:
+            # external files are named after hashes of values they keep compressed, not of their own content
+            manifest["files"][f"{_blobs_name}/{blob.parent.name}/{blob.name}"] = _file_hash(blob)
+
+        mode = _archive_modes[config.get_depot_info().get("compression", "none")]
+        with tarfile.open(path, f"w:{mode}") as archive:
+            data = json.dumps(manifest, indent=2).encode()
+            info = tarfile.TarInfo(_manifest_name)
+            info.size, info.mtime = len(data), int(manifest["created"])
+            archive.addfile(info, io.BytesIO(data))
+            archive.add(copy, _database_name)
+            for blob in blobs:
+                archive.add(blob, f"{_blobs_name}/{blob.parent.name}/{blob.name}")
+    return manifest
+
+
+def restore(path: str | Path) -> dict:
+    """Replace depot content with archived snapshot
+
+    :param path: archive path
+    :return: archive manifest
+    """
+    # unpack next to the database, as big as it is
+    with (
+        tarfile.open(path, "r:*") as archive,
+        tempfile.TemporaryDirectory(dir=external.directory().parent) as directory,
+    ):
+        manifest = json.load(archive.extractfile(_manifest_name))
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"Unknown snapshot format {manifest.get('format')}")
+        archive.extractall(directory, filter="data")
+        directory = Path(directory)
+        for name, digest in manifest["files"].items():
+            if not (directory / name).is_file() or _file_hash(directory / name) != digest:
+                raise ValueError(f"Snapshot file {name} is missing or damaged")
+
+        blobs = directory / _blobs_name
+        if blobs.exists():
+            shutil.copytree(blobs, external.directory(), copy_function=_copy_missing, dirs_exist_ok=True)
+        # backup API replaces database pages under SQLite locks, so WAL and other connections stay consistent
+        engine = get_engine()
+        engine.dispose()
+        with sqlite3.connect(directory / _database_name) as source, engine.connect() as connection:
+            source.backup(connection.connection.driver_connection)
+        source.close()
+
+    engine.dispose()
+    # snapshot may be made by older version
+    _create_database_tables(engine)
+    from .migrations import upgrade
+
+    upgrade(engine)
+    for obj_type in _object_to_model_class:
+        cache.invalidate(obj_type)
+    return manifest
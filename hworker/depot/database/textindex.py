@@ -0,0 +1,159 @@
+"""Full-text index of solution sources.
+
+Every distinct text file body is indexed once in the solution_text FTS5 table, its row ID is derived
+from the body content hash. The solution_file table maps every solution version file to its text row,
+so queries never read and unpack solutions themselves. Files that are not UTF-8 texts are not indexed.
+"""
+
+from collections.abc import Iterable
+from itertools import batched
+
+import sqlalchemy
+import sqlalchemy.exc
+from sqlalchemy import Connection
+from sqlalchemy.orm import Session
+
+from . import blobs
+from .common import _sqlite_max_variables
+from .models import Solution, latest_version_table, solution_file_table, solution_text_table
+from ..objects import FileMatch
+
+
+def text_id(digest: str) -> int:
+    """Get full-text index row ID of file body
+
+    :param digest: file body content hash
+    :return: 60 bit row ID, collisions are negligible for any number of files of a course
+    """
+    return int(digest[:15], 16)
+
+
+def _text(content: bytes) -> str | None:
+    try:
+        return str(content, "utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def drop(session: Session | Connection, versions: Iterable[tuple[str, float]]) -> None:
+    """Forget files of solution versions, their texts stay indexed till garbage collection
+
+    :param session: session to delete within
+    :param versions: (ID, timestamp) pairs of solution versions
+    """
+    files = solution_file_table
+    for chunk in batched(versions, _sqlite_max_variables // 2):
+        session.execute(sqlalchemy.delete(files).where(sqlalchemy.tuple_(files.c.ID, files.c.timestamp).in_(chunk)))
+
+
+def index(session: Session | Connection, rows: list[dict], found: dict[str, bytes]) -> None:
+    """Index files of solution rows being stored
+
+    :param session: session to store within
+    :param rows: solution column values with packed content manifests
+    :param found: file bodies by their hashes, as packed
+    """
+    drop(session, [(row["ID"], row["timestamp"]) for row in rows])
+    digests = {digest for row in rows for digest in row["content"].values()}
+    ids = {digest: text_id(digest) for digest in digests}
+    indexed = set()
+    for chunk in batched(ids.values(), _sqlite_max_variables):
+        indexed.update(
+            session.scalars(
+                sqlalchemy.select(solution_text_table.c.rowid).where(solution_text_table.c.rowid.in_(chunk))
+            )
+        )
+    texts = [
+        {"rowid": ids[digest], "content": text}
+        for digest in digests
+        if ids[digest] not in indexed and digest in found and (text := _text(found[digest])) is not None
+    ]
+    if texts:
+        session.execute(sqlalchemy.insert(solution_text_table), texts)
+    indexed.update(text["rowid"] for text in texts)
+
+    files = [
+        {
+            "ID": row["ID"],
+            "timestamp": row["timestamp"],
+            "path": path,
+            "USER_ID": row["USER_ID"],
+            "TASK_ID": row["TASK_ID"],
+            "text_id": ids[digest],
+        }
+        for row in rows
+        for path, digest in row["content"].items()
+        if ids[digest] in indexed
+    ]
+    if files:
+        session.execute(sqlalchemy.insert(solution_file_table), files)
+
+
+def fill(session: Session | Connection) -> None:
+    """Index files of all stored solutions
+
+    :param session: session to store within
+    """
+    keys = session.execute(sqlalchemy.select(Solution.ID, Solution.timestamp)).all()
+    for chunk in batched(keys, _sqlite_max_variables // 2):
+        rows = [
+            row._asdict()
+            for row in session.execute(
+                sqlalchemy.select(
+                    Solution.ID, Solution.USER_ID, Solution.TASK_ID, Solution.timestamp, Solution.content
+                ).where(sqlalchemy.tuple_(Solution.ID, Solution.timestamp).in_(chunk))
+            )
+        ]
+        # rows stored before the blob table appeared hold file bodies themselves
+        found = blobs.pack(Solution, rows)
+        found |= blobs.load(
+            session, (digest for row in rows for digest in row["content"].values() if digest not in found)
+        )
+        index(session, rows, found)
+
+
+def collect_garbage(session: Session | Connection) -> int:
+    """Delete indexed texts no solution file refers to
+
+    :param session: session to delete within
+    :return: number of deleted texts
+    """
+    return session.execute(
+        sqlalchemy.delete(solution_text_table).where(
+            solution_text_table.c.rowid.not_in(sqlalchemy.select(solution_file_table.c.text_id))
+        )
+    ).rowcount
+
+
+def search(session: Session | Connection, query: str, task: str | None = None, actual: bool = True) -> list[FileMatch]:
+    """Find solution files matching full-text query
+
+    :param session: session to search within
+    :param query: SQLite FTS5 query, e.g. "eval" or "import AND numpy"
+    :param task: find only solutions of this task
+    :param actual: find only latest versions of solutions
+    :return: matching files, latest solution versions first
+    """
+    files, texts = solution_file_table, solution_text_table
+    statement = (
+        sqlalchemy.select(files.c.ID, files.c.USER_ID, files.c.TASK_ID, files.c.timestamp, files.c.path)
+        .join(texts, texts.c.rowid == files.c.text_id)
+        .where(texts.c.content.match(query))
+        .order_by(files.c.timestamp.desc(), files.c.ID, files.c.path)
+    )
+    if task is not None:
+        statement = statement.where(files.c.TASK_ID == task)
+    if actual:
+        latest = latest_version_table
+        statement = statement.join(
+            latest,
+            sqlalchemy.and_(
+                latest.c.table_name == Solution.__tablename__,
+                latest.c.ID == files.c.ID,
+                latest.c.timestamp == files.c.timestamp,
+            ),
+        )
+    try:
+        return [FileMatch(*row) for row in session.execute(statement)]
+    except sqlalchemy.exc.OperationalError as error:
+        raise ValueError(f"Wrong full-text query {query!r}: {error.orig}") from error
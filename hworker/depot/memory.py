@@ -0,0 +1,380 @@
+"""In-memory depot backend.
+
+Objects are kept in process-local dictionaries, so nothing is written to disk and every restart begins empty.
+Useful for personal checks and test runs.
+"""
+import contextlib
+import copy
+import operator
+import re
+import threading
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+from . import objects
+from .database.functions import _check_object_to_store, _get_fields_from_object
+from ..log import get_logger
+
+ObjectSuccessor = TypeVar("ObjectSuccessor", bound=objects.StoreObject)
+
+# type: {ID: {timestamp: object}}
+_storage: dict[type[objects.StoreObject], dict[str, dict[float, objects.StoreObject]]] = {}
+_journal: list[objects.Change] = []
+# consumer: last processed journal sequence number
+_cursors: dict[str, tuple[int, set[type[objects.StoreObject]] | None]] = {}
+_last_seq = 0
+_lock = threading.RLock()
+
+
+def _like(value: str, pattern: str) -> bool:
+    # SQL LIKE: "%" is any string, "_" is any character, ASCII letters are case-insensitive
+    regexp = "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern)
+    return re.fullmatch(regexp, value, re.IGNORECASE | re.DOTALL) is not None
+
+
+_conditions: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "like": _like,
+    "startswith": lambda value, prefix: value.startswith(prefix),
+    "in": lambda value, values: value in values,
+    "not in": lambda value, values: value not in values,
+    "between": lambda value, bounds: bounds[0] <= value <= bounds[1],
+    "regexp": lambda value, pattern: value is not None and re.search(pattern, str(value)) is not None,
+    "is null": lambda value, _: value is None,
+    "is not null": lambda value, _: value is not None,
+}
+
+
+def _matches(obj: objects.StoreObject, criteria: Iterable[objects.Criteria]) -> bool:
+    return all(
+        (
+            any(_matches(obj, group) for group in item.field_value)
+            if item.condition == "or"
+            else _conditions[item.condition](getattr(obj, item.field_name), item.field_value)
+        )
+        for item in criteria
+    )
+
+
+def _record(obj_type: type[objects.StoreObject], ID: str, timestamp: float, op: str) -> None:
+    global _last_seq
+    _last_seq += 1
+    _journal.append(objects.Change(_last_seq, obj_type, ID, timestamp, op))
+
+
+def _write_objects(objs: Iterable[ObjectSuccessor]) -> None:
+    with _lock:
+        for obj in objs:
+            versions = _storage.setdefault(type(obj), {}).setdefault(obj.ID, {})
+            if not obj.is_versioned():
+                # there must be only one object with given ID
+                versions.clear()
+            versions[obj.timestamp] = copy.deepcopy(obj)
+            _record(type(obj), obj.ID, obj.timestamp, "store")
+
+
+def store(obj: ObjectSuccessor) -> None:
+    """Store object into memory
+    :param obj: object to store
+    """
+    get_logger(__name__).debug(f"Stored {type(obj).__name__}: {str(obj)[:100]}")
+
+    _check_object_to_store(obj)
+    _write_objects([obj])
+
+
+def store_many(objs: Iterable[ObjectSuccessor]) -> None:
+    """Store a batch of objects into memory
+    :param objs: objects to store, later objects replace earlier ones just like in sequential store() calls
+    """
+    objs = list(objs)
+    get_logger(__name__).debug(f"Stored {len(objs)} objects in batch")
+
+    for obj in objs:
+        _check_object_to_store(obj)
+    _write_objects(objs)
+
+
+def _create_object(obj: objects.StoreObject, return_fields: list[str] | None) -> objects.StoreObject:
+    if return_fields is None:
+        return copy.deepcopy(obj)
+    return type(obj)(**{name: copy.deepcopy(getattr(obj, name)) for name in return_fields})
+
+
+def _found(
+    obj_type: type[objects.StoreObject],
+    criteria: tuple[objects.Criteria, ...],
+    actual: bool,
+    as_of: float | None = None,
+) -> list[objects.StoreObject]:
+    found = []
+    with _lock:
+        for versions in _storage.get(obj_type, {}).values():
+            matching = [
+                obj
+                for obj in versions.values()
+                if _matches(obj, criteria) and (as_of is None or obj.timestamp <= as_of)
+            ]
+            if (actual or as_of is not None) and obj_type._is_versioned and matching:
+                matching = [max(matching, key=operator.attrgetter("timestamp"))]
+            found.extend(matching)
+    return sorted(found, key=operator.attrgetter("timestamp"), reverse=True)
+
+
+def search(
+    obj_type: type[objects.StoreObject],
+    *criteria: objects.Criteria,
+    return_fields: list[str] = None,
+    first: bool = False,
+    actual: bool = False,
+    as_of: float = None,
+    **options,
+) -> Iterator[ObjectSuccessor] | Optional[ObjectSuccessor]:
+    """Search for object in memory
+    :param obj_type: type of object to search
+    :param criteria: criteria for searching
+    :param return_fields: filter for return fields
+    :param first: return only first elem
+    :param actual: return only latest version of object (grouping them by id)
+    :param as_of: return only latest version of object not later than this timestamp
+    :param options: database backend options, ignored
+    :return: generator of found objects
+    """
+    get_logger(__name__).debug(f"Searched for {obj_type.__name__}")
+
+    if return_fields is not None and not set(return_fields) <= set(_get_fields_from_object(obj_type())):
+        raise ValueError("Requested field not found in object")
+
+    found = _found(obj_type, criteria, actual, as_of)
+    if first:
+        return _create_object(found[0], return_fields) if found else None
+    return (_create_object(obj, return_fields) for obj in found)
+
+
+def search_many(
+    obj_type: type[objects.StoreObject],
+    ids: Iterable[str],
+    *criteria: objects.Criteria,
+    return_fields: list[str] = None,
+    actual: bool = True,
+) -> dict[str, ObjectSuccessor] | dict[str, list[ObjectSuccessor]]:
+    """Search for objects with given IDs in memory
+    :param obj_type: type of objects to search
+    :param ids: IDs of objects
+    :param criteria: additional criteria for searching
+    :param return_fields: filter for return fields, ID is always returned
+    :param actual: return only latest version of objects, all versions otherwise
+    :return: found objects by ID, lists of versions (latest first) for versioned objects if not actual
+    """
+    ids = set(ids)
+    if return_fields is not None and "ID" not in return_fields:
+        return_fields = ["ID", *return_fields]
+    if not set(return_fields or []) <= set(_get_fields_from_object(obj_type())):
+        raise ValueError("Requested field not found in object")
+
+    found = {}
+    for obj in _found(obj_type, criteria, actual):
+        if obj.ID not in ids:
+            continue
+        obj = _create_object(obj, return_fields)
+        if actual or not obj_type._is_versioned:
+            found.setdefault(obj.ID, obj)
+        else:
+            found.setdefault(obj.ID, []).append(obj)
+    return found
+
+
+def _avg(values: list) -> Any:
+    return sum(values) / len(values) if values else None
+
+
+_aggregate_functions: dict[str, Callable[[list], Any]] = {
+    "avg": _avg,
+    "min": lambda values: min(values, default=None),
+    "max": lambda values: max(values, default=None),
+    "sum": lambda values: sum(values) if values else None,
+    "count": len,
+}
+
+
+def aggregate(
+    obj_type: type[objects.StoreObject],
+    *criteria: objects.Criteria,
+    group_by: list[str] = None,
+    metrics: dict[str, str],
+    actual: bool = False,
+) -> list[dict[str, Any]]:
+    """Aggregate object fields in memory
+    :param obj_type: type of objects to aggregate
+    :param criteria: criteria for searching
+    :param group_by: fields to group objects by, all found objects are one group if None
+    :param metrics: field name: aggregate function (one of objects.aggregate_functions) dict, fields not grouped by
+    :param actual: aggregate only latest versions of objects
+    :return: list of group field and metric values dictionaries
+    """
+    group_by = group_by or []
+    if any(function not in _aggregate_functions for function in metrics.values()):
+        raise ValueError(f"Unknown aggregate function. Possible are {objects.aggregate_functions}")
+    if grouped := set(group_by) & set(metrics):
+        raise ValueError(f"Fields {sorted(grouped)} can not be both grouped by and aggregated")
+
+    groups: dict[tuple, list[objects.StoreObject]] = {} if group_by else {(): []}
+    for obj in _found(obj_type, criteria, actual):
+        groups.setdefault(tuple(getattr(obj, name) for name in group_by), []).append(obj)
+    return [
+        dict(zip(group_by, key))
+        | {
+            name: _aggregate_functions[function]([getattr(obj, name) for obj in found])
+            for name, function in metrics.items()
+        }
+        for key, found in groups.items()
+    ]
+
+
+def delete(obj_type: type[objects.StoreObject], *criteria: objects.Criteria) -> None:
+    """Delete object from memory
+    :param obj_type: type of object to delete or its instance
+    :param criteria: criteria for searching objects for delete
+    """
+    get_logger(__name__).debug(f"Deleted {str(obj_type)[:100]}")
+
+    if isinstance(obj_type, objects.StoreObject):
+        obj_type = type(obj_type)
+
+    with _lock:
+        table = _storage.get(obj_type, {})
+        for ID, versions in list(table.items()):
+            for timestamp, obj in list(versions.items()):
+                if _matches(obj, criteria):
+                    del versions[timestamp]
+                    _record(obj_type, ID, timestamp, "delete")
+            if not versions:
+                del table[ID]
+
+
+def delete_versions(obj_type: type[objects.StoreObject], versions: Iterable[tuple[str, float]]) -> None:
+    """Delete given versions of objects from memory
+    :param obj_type: type of objects to delete
+    :param versions: (ID, timestamp) pairs of objects to delete
+    """
+    with _lock:
+        table = _storage.get(obj_type, {})
+        for ID, timestamp in versions:
+            if table.get(ID, {}).pop(timestamp, None) is not None:
+                _record(obj_type, ID, timestamp, "delete")
+            if ID in table and not table[ID]:
+                del table[ID]
+
+
+def _tokens(text: str) -> set[str]:
+    # the same tokens as SQLite unicode61 tokenizer with "_" token character makes, case-insensitive
+    return set(re.findall(r"\w+", text.casefold()))
+
+
+def fulltext(query: str, task: str = None, actual: bool = True) -> list[objects.FileMatch]:
+    """Find solution files by their text in memory
+    :param query: words all to be found in file, prefix* ones included, no other full-text query syntax is supported
+    :param task: find only solutions of this task
+    :param actual: find only latest versions of solutions
+    :return: matching files, latest solution versions first
+    """
+    words = [word.casefold() for word in query.split()]
+    if not all(re.fullmatch(r"\w+\*?", word) for word in words):
+        raise ValueError(f"Wrong full-text query {query!r}: only words and prefixes are supported")
+    criteria = [] if task is None else [objects.Criteria("TASK_ID", "==", task)]
+
+    found = []
+    for solution in _found(objects.Solution, criteria, actual):
+        for path, content in sorted(solution.content.items()):
+            try:
+                tokens = _tokens(str(content, "utf-8"))
+            except UnicodeDecodeError:
+                continue
+            if all(
+                any(token.startswith(word[:-1]) for token in tokens) if word.endswith("*") else word in tokens
+                for word in words
+            ):
+                found.append(
+                    objects.FileMatch(solution.ID, solution.USER_ID, solution.TASK_ID, solution.timestamp, path)
+                )
+    return found
+
+
+def maintain() -> dict[str, tuple[int, int | None]]:
+    """Drop processed journal and count objects, there is nothing to compact in memory
+
+    :return: type name: (number of objects, None) report
+    """
+    with _lock:
+        processed: dict[type[objects.StoreObject], int] = {}
+        for seq, types in _cursors.values():
+            for obj_type in types if types is not None else {change.type for change in _journal}:
+                processed[obj_type] = min(seq, processed.get(obj_type, seq))
+        # nobody reads changes of other types
+        _journal[:] = [change for change in _journal if change.seq > processed.get(change.type, _last_seq)]
+        return {
+            obj_type.__name__: (sum(len(versions) for versions in table.values()), None)
+            for obj_type, table in _storage.items()
+        }
+
+
+def changes(since: int = 0, types: Iterable[type[objects.StoreObject]] = None) -> list[objects.Change]:
+    """Get journal of object versions stored or deleted after given sequence number
+    :param since: last processed sequence number, 0 for the whole journal
+    :param types: types of objects to get changes of, all types if None
+    :return: changes in order they were made
+    """
+    types = set(types) if types is not None else None
+    with _lock:
+        return [change for change in _journal if change.seq > since and (types is None or change.type in types)]
+
+
+def last_seq() -> int:
+    """Get sequence number of the latest journal record, trimmed ones included
+    :return: sequence number, 0 if nothing was journaled yet
+    """
+    return _last_seq
+
+
+def get_cursor(consumer: str) -> int:
+    """Get last journal sequence number processed by consumer
+    :param consumer: consumer name
+    :return: sequence number, 0 if consumer has processed nothing yet
+    """
+    return _cursors.get(consumer, (0, None))[0]
+
+
+def set_cursor(consumer: str, seq: int, types: Iterable[type[objects.StoreObject]] = None) -> None:
+    """Remember last journal sequence number processed by consumer
+    :param consumer: consumer name
+    :param seq: sequence number
+    :param types: types of objects consumer reads changes of, all types if None
+    """
+    _cursors[consumer] = seq, set(types) if types is not None else None
+
+
+def snapshot(path: str) -> dict:
+    """Memory depot has nothing to archive
+    :param path: archive path
+    """
+    raise ValueError("Memory depot has no snapshots, switch depot backend to sqlite to use them")
+
+
+def restore(path: str) -> dict:
+    """Memory depot has nothing to restore to
+    :param path: archive path
+    """
+    raise ValueError("Memory depot has no snapshots, switch depot backend to sqlite to use them")
+
+
+@contextlib.contextmanager
+def performance_profile(name: str) -> Iterator[None]:
+    """Performance profiles are SQLite pragmas, so there is nothing to switch in memory
+
+    :param name: profile name, ignored
+    """
+    yield
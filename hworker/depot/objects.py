@@ -1,9 +1,9 @@
 """Interface objects for depot management"""
 import datetime
 import enum
-from collections.abc import Iterator
-from inspect import getmembers_static
-from typing import Any
+import re
+from collections.abc import Iterable, Iterator
+from typing import Any, NamedTuple
 from numbers import Real
 
 
@@ -25,6 +25,10 @@ class StoreObject:
     timestamp: float  # Timestamp
     _is_versioned: bool
     _public_fields: set[str] = {"ID", "USER_ID", "TASK_ID", "timestamp"}
+    # Field names in alphabetical order, computed for every subclass from its __slots__
+    _field_names: tuple[str, ...] = ("ID", "TASK_ID", "USER_ID", "timestamp")
+    _public_field_names: tuple[str, ...] = ("ID", "TASK_ID", "USER_ID", "timestamp")
+    __slots__ = ("ID", "USER_ID", "TASK_ID", "timestamp")
 
     def __init__(self, ID: str = None, USER_ID: str = None, TASK_ID: str = None, timestamp: float = None, **kwargs):
         super().__init__(**kwargs)
@@ -33,9 +37,16 @@ class StoreObject:
         self.TASK_ID = TASK_ID
         self.timestamp = timestamp
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_names = tuple(
+            sorted(name for klass in cls.__mro__ for name in getattr(klass, "__slots__", ()) if is_field(name, None))
+        )
+        cls._public_field_names = tuple(name for name in cls._field_names if name in cls._public_fields)
+
     def keys(self) -> Iterator[str]:
         """Returns all names of only public fields"""
-        yield from self.items(0)
+        yield from self._public_field_names
 
     def values(self) -> Iterator:
         """Returns all values of only public fields"""
@@ -43,7 +54,7 @@ class StoreObject:
 
     def items(self, idx: int | slice = slice(0, 2)) -> Iterator:
         """Returns generator that yields only public fields"""
-        return (kv[idx] for kv in getmembers_static(self) if kv[0] in self._public_fields)
+        return ((name, getattr(self, name))[idx] for name in self._public_field_names)
 
     def is_versioned(self):
         """Returns _is_versioned fields"""
@@ -51,12 +62,13 @@ class StoreObject:
 
     def __iter__(self):
         """Returns generator that yields ALL fields"""
-        return (kv for kv in getmembers_static(self) if is_field(*kv))
+        return ((name, getattr(self, name)) for name in self._field_names)
 
     def __getitem__(self, idx: int | str) -> Any:
         match idx:
             case int(index):
-                return list(self)[index]
+                name = self._field_names[index]
+                return name, getattr(self, name)
             case str(name):
                 return getattr(self, name)
         raise KeyError(f"Index type must be int ot str, not {idx.__class__}")
@@ -87,6 +99,7 @@ class StoreObject:
 class RawData(StoreObject):
     content: bytes
     _is_versioned: bool = False
+    __slots__ = ("content",)
 
     def __init__(self, content: bytes = None, **kwargs):
         fields = {"USER_ID": ".", "TASK_ID": ".", "timestamp": datetime.datetime.now().timestamp()}
@@ -97,6 +110,7 @@ class RawData(StoreObject):
 class FileObject:
     content: bytes
     timestamp: float
+    __slots__ = ("content", "timestamp")
 
     def __init__(self, content: bytes = None, timestamp: float = None):
         self.content = content
@@ -107,6 +121,11 @@ class FileObject:
             [getattr(self, field) == getattr(other, field) for field in ["content", "timestamp"]]
         )
 
+    def __setstate__(self, state):
+        # objects pickled before __slots__ appeared keep their fields in a dict
+        for name, value in (state[1] if isinstance(state, tuple) else state).items():
+            setattr(self, name, value)
+
     def __str__(self):
         return ", ".join(map(str, [self.content, self.timestamp]))
 
@@ -118,6 +137,7 @@ class Homework(StoreObject):
     content: dict[str, FileObject]  # filepath : file_content
     is_broken: bool
     _is_versioned: bool = True
+    __slots__ = ("content", "is_broken")
 
     def __init__(self, content: dict[str, FileObject] = None, is_broken: bool = None, **kwargs):
         super().__init__(**kwargs)
@@ -136,6 +156,7 @@ class Check(StoreObject):
     category: CheckCategoryEnum
     _is_versioned: bool = False
     _public_fields: set[str] = StoreObject._public_fields | {"category"}
+    __slots__ = ("content", "category")
 
     def __init__(self, content: dict[str, bytes] = None, category: CheckCategoryEnum = None, **kwargs):
         super().__init__(**kwargs)
@@ -147,6 +168,7 @@ class Solution(StoreObject):
     content: dict[str, bytes]  # filepath : file_content
     checks: dict[str, list]  # list[ID]
     _is_versioned: bool = True
+    __slots__ = ("content", "checks")
 
     def __init__(self, content: dict[str, bytes] = None, checks: dict[str] = None, **kwargs):
         super().__init__(**kwargs)
@@ -172,6 +194,17 @@ class CheckResult(StoreObject):
     stderr: bytes
     _public_fields: set[str] = StoreObject._public_fields | {"category", "rating"}
     _is_versioned: bool = False
+    __slots__ = (
+        "rating",
+        "category",
+        "check_ID",
+        "check_timestamp",
+        "solution_ID",
+        "solution_timestamp",
+        "verdict",
+        "stdout",
+        "stderr",
+    )
 
     def __init__(
         self,
@@ -206,6 +239,7 @@ class TaskQualifier(StoreObject):
     content: str
     _public_fields: set[str] = {"ID", "timestamp"}
     _is_versioned: bool = False
+    __slots__ = ("name", "content")
 
     def __init__(self, name: str = None, content: str = None, **kwargs):
         kwargs["USER_ID"] = ""
@@ -222,6 +256,7 @@ class TaskScore(StoreObject):
     rating: float
     _public_fields: set[str] = {"ID", "USER_ID", "TASK_ID", "name", "rating", "timestamp"}
     _is_versioned: bool = False
+    __slots__ = ("name", "rating")
 
     def __init__(self, name: str = None, rating: float = None, **kwargs):
         super().__init__(**kwargs)
@@ -237,6 +272,7 @@ class UserQualifier(StoreObject):
     content: str
     _public_fields: set[str] = {"ID", "timestamp"}
     _is_versioned: bool = False
+    __slots__ = ("name", "content")
 
     def __init__(self, name: str = None, content: str = None, **kwargs):
         kwargs["USER_ID"] = ""
@@ -253,6 +289,7 @@ class UserScore(StoreObject):
     rating: float
     _public_fields: set[str] = {"ID", "USER_ID", "TASK_ID", "name", "rating", "timestamp"}
     _is_versioned: bool = False
+    __slots__ = ("name", "rating")
 
     def __init__(self, name: str = None, rating: float = None, **kwargs):
         kwargs["TASK_ID"] = ""
@@ -269,6 +306,7 @@ class Formula(StoreObject):
     content: str
     _public_fields: set[str] = {"ID", "timestamp"}
     _is_versioned: bool = False
+    __slots__ = ("name", "content")
 
     def __init__(self, name: str = None, content: str = None, **kwargs):
         kwargs["USER_ID"] = ""
@@ -285,6 +323,7 @@ class FinalScore(StoreObject):
     rating: str
     _public_fields: set[str] = {"ID", "USER_ID", "TASK_ID", "rating", "timestamp"}
     _is_versioned: bool = False
+    __slots__ = ("name", "rating")
 
     def __init__(self, name: str = None, rating: str = None, **kwargs):
         kwargs["TASK_ID"] = ""
@@ -299,6 +338,7 @@ class UpdateTime(StoreObject):
     name: str
     _public_fields: set[str] = {"ID", "timestamp"}
     _is_versioned: bool = False
+    __slots__ = ("name",)
 
     def __init__(self, name: str = None, **kwargs):
         kwargs["ID"] = f"{name}"
@@ -310,6 +350,15 @@ class UpdateTime(StoreObject):
 
 class Plagiary(StoreObject):
     content: list[str]  # ID's ?? or list[Homework] or list[Solution]
+    __slots__ = ("content",)
+
+    def __init__(self, content: list[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.content = content
+
+
+# Aggregate functions of depot aggregate(), named after their SQL counterparts
+aggregate_functions: set[str] = {"avg", "min", "max", "sum", "count"}
 
 
 class Criteria:
@@ -322,18 +371,73 @@ class Criteria:
         ">=": "__ge__",
         "like": "like",
         "startswith": "startswith",
+        "in": "in_",  # value is a collection
+        "not in": "not_in",  # value is a collection
+        "between": "between",  # value is (lower, upper) pair, both included
+        "regexp": "regexp_match",  # value is re.search() pattern
+        "is null": "is_",  # value is ignored
+        "is not null": "is_not",  # value is ignored
+        "or": "or_",  # value is a tuple of criteria tuples, made by any_of()
     }
 
     field_name: str
     condition: str
     field_value: Any
 
-    def __init__(self, field_name, condition, field_value):
+    def __init__(self, field_name, condition, field_value=None):
         if condition not in self._pos_conditions:
             raise ValueError(f"Condition is not possible. Possible is {self._pos_conditions}")
+        if condition in ("in", "not in"):
+            field_value = tuple(field_value)
+        elif condition == "between" and len(field_value) != 2:
+            raise ValueError("Condition between needs (lower, upper) pair")
+        elif condition == "regexp":
+            try:
+                re.compile(field_value)
+            except re.error as error:
+                raise ValueError(f"Wrong regexp {field_value!r}: {error}") from error
         self.field_name = field_name
         self.condition = condition
         self.field_value = field_value
 
+    @classmethod
+    def any_of(cls, *alternatives: "Criteria | Iterable[Criteria]") -> "Criteria":
+        """Make criteria matching if any of alternatives matches
+        :param alternatives: criteria or iterables of criteria that all must match
+        :return: OR-group criteria
+        """
+        groups = tuple((item,) if isinstance(item, Criteria) else tuple(item) for item in alternatives)
+        return cls(None, "or", groups)
+
+    def field_names(self) -> set[str]:
+        """Get names of all the fields criteria depend on"""
+        if self.condition == "or":
+            return {name for group in self.field_value for item in group for name in item.field_names()}
+        return {self.field_name}
+
     def get_condition_function(self):
         return self._pos_conditions[self.condition]
+
+
+class Change(NamedTuple):
+    """Depot journal record: object version that was stored or deleted"""
+
+    seq: int
+    type: type[StoreObject]
+    ID: str
+    timestamp: float
+    op: str  # one of change_operations
+
+
+# Operations recorded in depot journal
+change_operations: set[str] = {"store", "delete"}
+
+
+class FileMatch(NamedTuple):
+    """Solution file found by full-text search"""
+
+    ID: str
+    USER_ID: str
+    TASK_ID: str
+    timestamp: float
+    path: str
@@ -0,0 +1,126 @@
+"""Per-call statistics of depot operations.
+
+Every dispatched depot call is timed and counted by operation, object type and criteria shape
+(field names and conditions, but not values). Time spent in lazily read search results is added
+while they are consumed, so rows and latency of a search are complete when its generator is exhausted or closed.
+"""
+import functools
+import threading
+import time
+from collections.abc import Generator, Iterable
+from typing import Any, Callable
+
+from . import objects
+
+# operations that are timed, with the way to get object type name from their arguments
+_type_names: dict[str, Callable[..., str]] = {
+    "store": lambda obj, *args, **kwargs: type(obj).__name__,
+    "store_many": lambda objs, *args, **kwargs: ",".join(sorted({type(obj).__name__ for obj in objs})),
+    "search": lambda obj_type, *args, **kwargs: obj_type.__name__,
+    "search_many": lambda obj_type, *args, **kwargs: obj_type.__name__,
+    "aggregate": lambda obj_type, *args, **kwargs: obj_type.__name__,
+    "delete": lambda obj_type, *args, **kwargs: obj_type.__name__,
+    "delete_versions": lambda obj_type, *args, **kwargs: obj_type.__name__,
+}
+
+_stats: dict[tuple[str, str, str], dict[str, int | float]] = {}
+_lock = threading.Lock()
+
+
+def shape(criteria: Iterable[objects.Criteria]) -> str:
+    """Describe criteria without their values
+    :param criteria: search criteria
+    :return: criteria shape, e.g. "ID ==, timestamp <"
+    """
+    return ", ".join(
+        (
+            " or ".join(f"({shape(group)})" for group in rule.field_value)
+            if rule.condition == "or"
+            else f"{rule.field_name} {rule.condition}"
+        )
+        for rule in criteria
+    )
+
+
+def _record(key: tuple[str, str, str], duration: float, rows: int) -> None:
+    with _lock:
+        counters = _stats.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0, "rows": 0})
+        counters["count"] += 1
+        counters["total"] += duration
+        counters["max"] = max(counters["max"], duration)
+        counters["rows"] += rows
+
+
+def _rows(name: str, result: Any, args: tuple) -> int:
+    match name, result:
+        case "store", _:
+            return 1
+        case "store_many", _:
+            # stores return nothing, count written objects instead
+            return len(args[0])
+        case _, None:
+            return 0
+        case _, dict() | list():
+            return len(result)
+        case _:
+            return 1
+
+
+def _measured_stream(key: tuple[str, str, str], stream: Generator, duration: float) -> Generator:
+    rows = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                obj = next(stream)
+            finally:
+                duration += time.perf_counter() - start
+            rows += 1
+            yield obj
+    except StopIteration:
+        pass
+    finally:
+        stream.close()
+        _record(key, duration, rows)
+
+
+def measured(name: str, function: Callable) -> Callable:
+    """Wrap depot function to collect its statistics
+    :param name: depot function name
+    :param function: function to call
+    :return: function with the same arguments
+    """
+    if name not in _type_names:
+        return function
+
+    @functools.wraps(function)
+    def call(*args, **kwargs):
+        if name == "store_many":
+            # objects are iterated twice: for type names and for storing
+            args = (list(args[0]), *args[1:])
+        criteria = [arg for arg in args if isinstance(arg, objects.Criteria)]
+        key = (name, _type_names[name](*args, **kwargs), shape(criteria))
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        duration = time.perf_counter() - start
+        if isinstance(result, Generator):
+            return _measured_stream(key, result, duration)
+        _record(key, duration, _rows(name, result, args))
+        return result
+
+    return call
+
+
+def get_stats() -> dict[str, dict[str, int | float]]:
+    """Get statistics of depot calls made by this process
+    :return: "operation type [criteria shape]": {count, total and max seconds, rows} dictionary, slowest first
+    """
+    with _lock:
+        items = sorted(_stats.items(), key=lambda item: item[1]["total"], reverse=True)
+        return {f"{name} {type_name} [{criteria}]": dict(counters) for (name, type_name, criteria), counters in items}
+
+
+def reset() -> None:
+    """Forget collected statistics"""
+    with _lock:
+        _stats.clear()
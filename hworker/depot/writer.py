@@ -0,0 +1,101 @@
+"""Single writer process for parallel workers.
+
+Within single_writer() context, store() and store_many() calls of the process and its forked workers only put objects
+onto a queue. One writer process takes them from the queue and stores them by batches, so workers never wait
+for the database write lock. Stores are asynchronous: objects are guaranteed to be stored on context exit only.
+"""
+import contextlib
+import multiprocessing
+import multiprocessing.queues
+from typing import Iterable, Iterator
+
+from . import cache, database, objects
+from .database.functions import _check_object_to_store
+from .. import config
+from ..log import get_logger
+
+# depot functions routed to the writer while it is active
+routed: set[str] = {"store", "store_many"}
+
+_batch_size = 1000
+_queue: multiprocessing.queues.SimpleQueue | None = None
+
+
+def is_active() -> bool:
+    """Check if depot writes go to the writer process"""
+    return _queue is not None
+
+
+def store(obj: objects.StoreObject) -> None:
+    """Pass object to the writer process
+    :param obj: object to store
+    """
+    _check_object_to_store(obj)
+    _queue.put([obj])
+
+
+def store_many(objs: Iterable[objects.StoreObject]) -> None:
+    """Pass a batch of objects to the writer process
+    :param objs: objects to store, later objects replace earlier ones just like in sequential store() calls
+    """
+    objs = list(objs)
+    for obj in objs:
+        _check_object_to_store(obj)
+    _queue.put(objs)
+
+
+def _serve(objs_queue: multiprocessing.queues.SimpleQueue, batch_size: int) -> None:
+    done = False
+    while not done:
+        batch = objs_queue.get()
+        done = batch is None
+        # take whatever else is already queued, up to batch size
+        while not done and len(batch) < batch_size and not objs_queue.empty():
+            objs = objs_queue.get()
+            if objs is None:
+                done = True
+            else:
+                batch.extend(objs)
+        if batch:
+            database.store_many(batch)
+
+
+@contextlib.contextmanager
+def single_writer(batch_size: int = _batch_size) -> Iterator[None]:
+    """Store objects through one writer process within context
+
+    Does nothing unless processes are forked and SQLite backend is used,
+    as other workers do not share the queue and memory backend storage is not shared at all.
+    Turned off by depot "single_writer" config value.
+
+    :param batch_size: maximum number of objects stored in one transaction
+    """
+    # depot package imports this module, so its backend is looked up on call
+    from . import _backend
+
+    global _queue
+    if (
+        is_active()
+        or multiprocessing.get_start_method() != "fork"
+        or _backend() is not database
+        or not config.get_depot_info().get("single_writer", True)
+    ):
+        yield
+        return
+
+    context = multiprocessing.get_context("fork")
+    # simple queue writes objects at once, so nothing is lost when pool workers are terminated
+    objs_queue = context.SimpleQueue()
+    process = context.Process(target=_serve, args=(objs_queue, batch_size), name="depot writer", daemon=True)
+    process.start()
+    _queue = objs_queue
+    try:
+        # objects stored by writer process can not invalidate lookups cached here
+        with cache.suspended():
+            yield
+    finally:
+        _queue = None
+        objs_queue.put(None)
+        process.join()
+        if process.exitcode:
+            get_logger(__name__).error(f"Depot writer failed with exit code {process.exitcode}")
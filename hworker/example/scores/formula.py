@@ -1,7 +1,7 @@
 from operator import attrgetter
 
 from hworker.depot.objects import UserScore
-from hworker.depot import search
+from hworker.depot import aggregate
 
 __all__ = ["final"]
 
@@ -11,8 +11,7 @@ def _filter_by_name(name: str, scores: list[UserScore]):
 
 
 def _get_average():
-    vals = list(map(attrgetter("rating"), search(UserScore)))
-    return sum(vals) / len(vals) if len(vals) != 0 else 0
+    return aggregate(UserScore, metrics={"rating": "avg"})[0]["rating"] or 0
 
 
 def final(scores: list[UserScore]) -> str:
@@ -1,7 +1,7 @@
 """Parsing depot objects and basic execution functionality"""
-
 import datetime
 import tomllib
+from itertools import batched, chain
 from tomllib import loads
 from typing import Iterable
 
@@ -16,13 +16,12 @@ from ..config import (
     get_deadline_gap,
     user_checks,
 )
-from ..depot import store, search
+from ..depot import cache, changes, get_cursor, last_seq, set_cursor, store, store_many, search, search_many
 from ..depot.objects import (
     Homework,
     Check,
     Solution,
     CheckCategoryEnum,
-    Criteria,
     CheckResult,
     UpdateTime,
     FileObject,
@@ -32,6 +31,9 @@ from ..log import get_logger
 from .screenplay import screenplay_all
 
 _default_timestamp = datetime.datetime.fromisoformat("2009-05-17 20:09:00").timestamp()
+_parse_batch_size = 500
+# depot journal consumer name of homework parsing
+_parse_consumer = "make.parse"
 type sometimes = datetime.datetime | datetime.date | float | int | StoreObject
 
 
@@ -138,14 +140,41 @@ def parse_all_stored_homeworks() -> None:
     :return: -
     """
     get_logger(__name__).info("Parse and store all homeworks...")
-    for hw in search(Homework, actual=True):
-        for cur_check in get_checks(hw):
-            store(cur_check)
-    for hw in search(Homework, actual=False):
-        store(get_solution(hw))
-    # See https://github.com/FrBrGeorge/HWorker/issues/93
-    for hw in search(Homework, actual=True):
-        store(get_solution(hw))
+    # homeworks stored since now are left for the next parse
+    seq = last_seq()
+    parsed = chain(
+        (cur_check for hw in search(Homework, actual=True) for cur_check in get_checks(hw)),
+        (get_solution(hw) for hw in search(Homework, actual=False)),
+        # See https://github.com/FrBrGeorge/HWorker/issues/93
+        (get_solution(hw) for hw in search(Homework, actual=True)),
+    )
+    # every homework version is walked, so store them by bounded batches
+    for batch in batched(parsed, _parse_batch_size):
+        store_many(batch)
+    set_cursor(_parse_consumer, seq, types=[Homework])
+
+
+def parse_new_homeworks() -> None:
+    """Parse homeworks stored since the last parse to Solution and Checks and store them with depot
+
+    :return: -
+    """
+    get_logger(__name__).info("Parse and store new homeworks...")
+    new = changes(since=get_cursor(_parse_consumer), types=[Homework])
+    if not new:
+        return
+    stored = {(change.ID, change.timestamp) for change in new if change.op == "store"}
+    # versions of every changed homework, latest first
+    versions = search_many(Homework, {ID for ID, timestamp in stored}, actual=False)
+    parsed = chain(
+        (cur_check for found in versions.values() for cur_check in get_checks(found[0])),
+        (get_solution(hw) for found in versions.values() for hw in found if (hw.ID, hw.timestamp) in stored),
+        # See https://github.com/FrBrGeorge/HWorker/issues/93
+        (get_solution(found[0]) for found in versions.values()),
+    )
+    for batch in batched(parsed, _parse_batch_size):
+        store_many(batch)
+    set_cursor(_parse_consumer, new[-1].seq, types=[Homework])
 
 
 def run_solution_checks_and_store(solution: Solution) -> None:
@@ -156,9 +185,9 @@ def run_solution_checks_and_store(solution: Solution) -> None:
     """
     get_logger(__name__).debug(f"Run all checks of {solution.ID} solution")
 
+    checkers = search_many(Check, solution.checks)
     for check_name in solution.checks:
-        checker = search(Check, Criteria("ID", "==", check_name), first=True)
-        check_result = check(checker, solution)
+        check_result = check(checkers.get(check_name), solution)
         store(check_result)
 
 
@@ -171,12 +200,13 @@ def run_solution_checks(solution: Solution) -> dict[str:CheckResult]:
     get_logger(__name__).debug(f"Run all checks of {solution.ID} solution")
 
     check_results = {}
+    checkers = search_many(Check, solution.checks)
     for check_name in solution.checks:
-        checker = search(Check, Criteria("ID", "==", check_name), first=True)
-        check_results[check_name] = check(checker, solution)
+        check_results[check_name] = check(checkers.get(check_name), solution)
     return check_results
 
 
+@cache.enabled()
 def check_all_solutions() -> None:
     """Run all solution checks for every actual solution and store results in depot
 
@@ -190,6 +220,7 @@ def check_all_solutions() -> None:
         run_solution_checks_and_store(solution)
 
 
+@cache.enabled()
 def check_new_solutions() -> None:
     """Run new solution checks for every actual solution and store results in depot
 
@@ -201,16 +232,20 @@ def check_new_solutions() -> None:
     solutions: Iterable[Solution] = search(Solution, actual=True)
 
     for solution in solutions:
+        checkers: dict[str, Check] = search_many(Check, solution.checks)
+        results: dict[str, CheckResult] = search_many(
+            CheckResult,
+            [get_result_ID(solution=solution, checker=checker) for checker in checkers.values()],
+            return_fields=["ID", "solution_timestamp", "check_timestamp"],
+        )
         for check_name in solution.checks:
-            checker: Check = search(Check, Criteria("ID", "==", check_name), first=True)
+            checker: Check = checkers.get(check_name)
 
             if checker is None:
                 get_logger(__name__).warn(f"Not found check named<{check_name}> from solution {solution}")
                 continue
 
-            result_obj: CheckResult = search(
-                CheckResult, Criteria("ID", "==", get_result_ID(solution=solution, checker=checker)), first=True
-            )
+            result_obj: CheckResult = results.get(get_result_ID(solution=solution, checker=checker))
 
             if result_obj is None or max(solution.timestamp, checker.timestamp) > min(
                 result_obj.solution_timestamp, result_obj.check_timestamp
@@ -11,7 +11,7 @@ from tempfile import TemporaryDirectory as tmpdir
 from ..log import get_logger
 from subprocess import run
 import hashlib
-from ..depot import store, search
+from ..depot import store, search, search_many
 from ..depot.objects import RawData, Criteria
 
 # report.01.second/./BOTH.txt
@@ -28,9 +28,14 @@ def screendump(command: str, directory: Path) -> bytes:
         return S.read_bytes() if S.exists() else "!255".encode()
 
 
+def screenplay_ID(both: bytes, timer: bytes) -> str:
+    """Get ID of stored screenplay result."""
+    return hashlib.md5(both + timer).hexdigest()
+
+
 def screenplay(both: bytes, timer: bytes) -> bytes:
     """Run scritreplay on both / timer data and dump result's screen buffer."""
-    md5 = hashlib.md5(both + timer).hexdigest()
+    md5 = screenplay_ID(both, timer)
     if answer := search(RawData, Criteria("ID", "==", md5), first=True):
         return answer.content
     with tmpdir() as Dname:
@@ -54,9 +59,18 @@ def screenplay_all(content: dict[bytes, bytes]) -> dict[bytes, bytes]:
         for name, value in content.items()
     }
     hosts, dumps = {host for host, path in records}, {}
+    pairs = {
+        host: (records[(host, "BOTH")], records[(host, "TIME")])
+        for host in hosts
+        if (host, "BOTH") in records and (host, "TIME") in records
+    }
+    # look already played pairs up at once
+    played = search_many(RawData, (screenplay_ID(*pair) for pair in pairs.values()))
     for host in hosts:
-        if (host, "BOTH") in records and (host, "TIME") in records:
-            dumps[host] = screenplay(records[(host, "BOTH")], records[(host, "TIME")])
+        if host in pairs and (answer := played.get(screenplay_ID(*pairs[host]))):
+            dumps[host] = answer.content
+        elif host in pairs:
+            dumps[host] = screenplay(*pairs[host])
         else:
             log.warning(f"Incomplete or incorrect {host} report")
     return dumps
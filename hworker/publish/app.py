@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 from itertools import islice
 
@@ -18,6 +19,7 @@ from flask import Flask, request, render_template, redirect
 
 from .lib import create_table
 from .. import config, depot
+from ..depot import aio
 from ..config import get_publish_info
 
 
@@ -37,40 +39,50 @@ app.config.update(get_publish_info())
 app.config["static_url_path"] = _get_static_path()
 
 
-def _get_data_for_user(user_id: str):
-    user_data: list = []
+async def _get_score_names() -> tuple[list[str], list[str], list[str]]:
+    found = await asyncio.gather(
+        *(
+            aio.search(search_object, return_fields=["name"])
+            for search_object in [depot.objects.Formula, depot.objects.UserQualifier, depot.objects.TaskQualifier]
+        )
+    )
+    return tuple([item.name for item in names] for names in found)
+
 
-    final_score_names = list(map(lambda x: x.name, depot.search(depot.objects.Formula)))
-    user_score_names = list(map(lambda x: x.name, depot.search(depot.objects.UserQualifier)))
-    task_qualifiers = list(map(lambda x: x.name, depot.search(depot.objects.TaskQualifier)))
+async def _get_data_for_user(user_id: str, score_names: tuple[list[str], list[str], list[str]] = None):
+    final_score_names, user_score_names, task_qualifiers = score_names or await _get_score_names()
     task_score_names = {task_id: task_qualifiers for task_id in config.get_tasks_list()}
 
+    # every score is a separate query, so run them all at once
+    scores = []
     for big_names, search_object in zip(
         [final_score_names, user_score_names, task_score_names],
         [depot.objects.FinalScore, depot.objects.UserScore, depot.objects.TaskScore],
     ):
         if isinstance(big_names, list):
             for name in big_names:
-                score = depot.search(
-                    search_object,
-                    depot.objects.Criteria("USER_ID", "==", user_id),
-                    depot.objects.Criteria("name", "==", name),
-                    first=True,
+                scores.append(
+                    aio.first(
+                        search_object,
+                        depot.objects.Criteria("USER_ID", "==", user_id),
+                        depot.objects.Criteria("name", "==", name),
+                        return_fields=["rating"],
+                    )
                 )
-                user_data.append(None if score is None else score.rating)
         else:
             for task_id, names in big_names.items():
                 for name in names:
-                    score = depot.search(
-                        search_object,
-                        depot.objects.Criteria("TASK_ID", "==", task_id),
-                        depot.objects.Criteria("USER_ID", "==", user_id),
-                        depot.objects.Criteria("name", "==", name),
-                        first=True,
+                    scores.append(
+                        aio.first(
+                            search_object,
+                            depot.objects.Criteria("TASK_ID", "==", task_id),
+                            depot.objects.Criteria("USER_ID", "==", user_id),
+                            depot.objects.Criteria("name", "==", name),
+                            return_fields=["rating"],
+                        )
                     )
-                    user_data.append(None if score is None else score.rating)
 
-    return user_data
+    return [None if score is None else score.rating for score in await asyncio.gather(*scores)]
 
 
 if get_publish_info()["url_prefix"]:
@@ -82,17 +94,14 @@ if get_publish_info()["url_prefix"]:
 @app.get(_get_full_url("/"))
 def index():
     users = config.get_uids()
-    data_per_user: dict[str, list] = dict()
 
-    final_score_names = list(map(lambda x: x.name, depot.search(depot.objects.Formula)))
-    user_score_names = list(map(lambda x: x.name, depot.search(depot.objects.UserQualifier)))
-    task_score_names = {
-        task_id: list(map(lambda x: x.name, depot.search(depot.objects.TaskQualifier)))
-        for task_id in config.get_tasks_list()
-    }
+    async def collect():
+        score_names = await _get_score_names()
+        found = await asyncio.gather(*(_get_data_for_user(user_id, score_names) for user_id in users))
+        return score_names, dict(zip(users, found))
 
-    for user_id in users:
-        data_per_user[user_id] = _get_data_for_user(user_id)
+    (final_score_names, user_score_names, task_qualifiers), data_per_user = asyncio.run(collect())
+    task_score_names = {task_id: task_qualifiers for task_id in config.get_tasks_list()}
 
     header: list = ["Users"]
     if len(final_score_names) != 0:
@@ -124,16 +133,20 @@ def info():
         depot.objects.CheckResult,
     ]
 
-    tables = dict()
-    for cur_object in objects_to_display:
-        find_objects = list(
-            depot.search(
-                cur_object,
-                depot.objects.Criteria("USER_ID", "==", username.replace("\xa0", " ")),
-                depot.objects.Criteria("TASK_ID", "==", taskname),
+    async def collect():
+        return await asyncio.gather(
+            *(
+                aio.search(
+                    cur_object,
+                    depot.objects.Criteria("USER_ID", "==", username.replace("\xa0", " ")),
+                    depot.objects.Criteria("TASK_ID", "==", taskname),
+                )
+                for cur_object in objects_to_display
             )
         )
 
+    tables = dict()
+    for cur_object, find_objects in zip(objects_to_display, asyncio.run(collect())):
         data = [[value for key, value in item] for item in find_objects]
 
         tables[cur_object.__name__] = create_table([key for key, value in cur_object()], data)
@@ -146,10 +159,11 @@ def student(user_id):
     if user_id not in config.get_uids():
         return redirect("/")
 
-    user_data: list = _get_data_for_user(user_id)
+    async def collect():
+        score_names = await _get_score_names()
+        return score_names, await _get_data_for_user(user_id, score_names)
 
-    user_score_names = list(map(lambda x: x.name, depot.search(depot.objects.UserQualifier)))
-    task_qualifiers = list(map(lambda x: x.name, depot.search(depot.objects.TaskQualifier)))
+    (_, user_score_names, task_qualifiers), user_data = asyncio.run(collect())
 
     user_qual_table = create_table(
         ["Task name", *user_score_names], [["All tasks", *user_data[1: 1 + len(user_score_names)]]]
@@ -174,14 +188,26 @@ def student(user_id):
 
 @app.get(_get_full_url("/status"))
 def status():
-    data: list[depot.objects.UpdateTime] = list(depot.search(depot.objects.UpdateTime))
+    data: list[depot.objects.UpdateTime] = list(
+        depot.search(depot.objects.UpdateTime, return_fields=["name", "timestamp"])
+    )
 
     rows = list(
         map(lambda x: [x.name, datetime.datetime.fromtimestamp(x.timestamp).strftime("%H:%M:%S %d.%m.%Y")], data)
     )
 
     table = create_table(["Event type", "Date and time"], rows)
+    stats_table = create_table(
+        ["Depot call", "Count", "Total, s", "Max, s", "Rows"],
+        [
+            [call, counters["count"], f"{counters['total']:.3f}", f"{counters['max']:.3f}", counters["rows"]]
+            for call, counters in depot.get_stats().items()
+        ],
+    )
 
     return render_template(
-        "status.html", table=table, current_time=datetime.datetime.now().strftime("%H:%M:%S %d.%m.%Y")
+        "status.html",
+        table=table,
+        stats_table=stats_table,
+        current_time=datetime.datetime.now().strftime("%H:%M:%S %d.%m.%Y"),
     )
@@ -93,9 +93,9 @@ def perform_qualifiers():
     depot.delete(depot.objects.UserScore)
     depot.delete(depot.objects.FinalScore)
 
-
     get_logger(__name__).info("Performing all imported qualifiers...")
     _current_timestamp = datetime.datetime.now().timestamp()
+    task_scores = []
     for USER_ID in config.get_uids():
         for TASK_ID in config.get_tasks_list():
             inputs = list(
@@ -108,7 +108,7 @@ def perform_qualifiers():
             for f_name, func in _get_functions_from_module("task_qualifier").items():
                 rating = _execute_user_func(func, inputs)
                 if rating is not None:
-                    depot.store(
+                    task_scores.append(
                         depot.objects.TaskScore(
                             ID=f"{USER_ID}/{TASK_ID}/{f_name}",
                             USER_ID=USER_ID,
@@ -118,12 +118,16 @@ def perform_qualifiers():
                             rating=rating,
                         )
                     )
+    # every stage is stored by one batch, next stage reads its inputs back from depot
+    depot.store_many(task_scores)
 
+    user_scores = []
+    for USER_ID in config.get_uids():
         inputs = list(depot.search(depot.objects.TaskScore, depot.objects.Criteria("USER_ID", "==", USER_ID)))
         for f_name, func in _get_functions_from_module("user_qualifier").items():
             rating = _execute_user_func(func, inputs)
             if rating is not None:
-                depot.store(
+                user_scores.append(
                     depot.objects.UserScore(
                         ID=f"{USER_ID}/{f_name}",
                         USER_ID=USER_ID,
@@ -132,13 +136,17 @@ def perform_qualifiers():
                         rating=rating,
                     )
                 )
+    depot.store_many(user_scores)
 
+    final_scores = []
+    for USER_ID in config.get_uids():
         inputs = list(depot.search(depot.objects.UserScore, depot.objects.Criteria("USER_ID", "==", USER_ID)))
         for f_name, func in _get_functions_from_module("formula").items():
             rating = _execute_user_func(func, inputs)
             if rating is not None:
-                depot.store(
+                final_scores.append(
                     depot.objects.FinalScore(
                         ID=f"{USER_ID}", USER_ID=USER_ID, timestamp=_current_timestamp, rating=rating
                     )
                 )
+    depot.store_many(final_scores)
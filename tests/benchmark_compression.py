@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Stored size and read throughput of depot compression methods.
+
+Stores distinct realistic values as RawData objects with each compression method, then reads them all back:
+    - small: files of the example repo and terminal logs of screenplay tests,
+    - inline: standard library modules, like solution files and check output kept in the database,
+    - external: standard library modules joined into values above "external_threshold", like long stdout or screen logs,
+    - binary: marshalled code of the same modules, like binary check output.
+Stored bytes are measured per value: column value length, or external file size for values kept outside.
+Run from the repository root: python -m tests.benchmark_compression [modules]
+"""
+import logging
+import marshal
+import sys
+import sysconfig
+import tempfile
+import time
+from itertools import batched
+from pathlib import Path
+
+import sqlalchemy
+
+import hworker.config
+from hworker.depot import delete, maintain, search, store_many
+from hworker.depot.database import common, external, get_engine, models
+from hworker.depot.objects import RawData
+
+_root = Path(__file__).parent.parent
+_sources = [*(_root / "hworker" / "example" / "repo").rglob("*.*"), *(_root / "tests").glob("*.txt")]
+
+
+def _use_database(path: Path) -> None:
+    hworker.config.get_depot_info()["database_path"] = str(path)
+    common.get_Session.cache_clear()
+    common.get_engine.cache_clear()
+
+
+def example_values(modules: int) -> dict[str, list[bytes]]:
+    """Collect values to store
+
+    :param modules: number of standard library modules to use
+    :return: value kind: values dictionary
+    """
+    threshold = hworker.config.get_depot_info()["external_threshold"]
+    paths = sorted(Path(sysconfig.get_paths()["stdlib"]).glob("*.py"))[:modules]
+    texts = [path.read_bytes() for path in paths]
+    # join modules one after another, so every external value is distinct
+    joined, current = [], b""
+    for text in texts:
+        current += text
+        if len(current) > threshold:
+            joined.append(current)
+            current = b""
+    return {
+        "small": [source.read_bytes() for source in _sources],
+        "inline": [text for text in texts if len(text) < threshold],
+        "external": joined,
+        "binary": [marshal.dumps(compile(text, str(path), "exec")) for path, text in zip(paths, texts)],
+    }
+
+
+def _stored_sizes() -> dict[str, int]:
+    table = models.RawData.__table__
+    raw = sqlalchemy.type_coerce(table.c.content, sqlalchemy.LargeBinary)
+    sizes = {}
+    with get_engine().connect() as connection:
+        for ID, value in connection.execute(sqlalchemy.select(table.c.ID, raw)):
+            if external.is_reference(value):
+                sizes[ID] = external._path(value[len(external.MARK) :].hex()).stat().st_size
+            else:
+                sizes[ID] = len(value)
+    return sizes
+
+
+def benchmark(method: str, directory: Path, values: dict[str, list[bytes]]) -> tuple[dict[str, int], float, float]:
+    """Store and read example values with given compression
+
+    :param method: compression method name
+    :param directory: directory to create database in
+    :param values: value kind: values dictionary
+    :return: stored bytes of every value kind, store and read time in seconds
+    """
+    hworker.config.get_depot_info()["compression"] = method
+    _use_database(directory / f"{method}.db")
+    objs = [
+        RawData(ID=f"{kind}/{number}", USER_ID="user", TASK_ID="task", timestamp=1, content=value)
+        for kind, found in values.items()
+        for number, value in enumerate(found)
+    ]
+    start = time.perf_counter()
+    for batch in batched(objs, 100):
+        store_many(batch)
+    stored = time.perf_counter() - start
+
+    start = time.perf_counter()
+    total = sum(len(obj.content) for obj in search(RawData))
+    read = time.perf_counter() - start
+    assert total == sum(len(value) for found in values.values() for value in found)
+
+    sizes = {kind: 0 for kind in values}
+    for ID, size in _stored_sizes().items():
+        sizes[ID.split("/")[0]] += size
+    delete(RawData)
+    maintain()
+    return sizes, stored, read
+
+
+def main(modules: int = 200) -> None:
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as name:
+        directory = Path(name)
+        hworker.config.create_config(directory / "benchmark.toml", {})
+        hworker.config.process_configs(str(directory / "benchmark.toml"))
+        values = example_values(modules)
+        raw = {kind: sum(map(len, found)) for kind, found in values.items()}
+        for kind, found in values.items():
+            print(f"{kind:>8}: {len(found)} values, {raw[kind] / 2**20:.2f} MiB")
+        kinds = " ".join(f"{kind + ' ratio':>14}" for kind in values)
+        print(f"{'method':>8} {kinds} {'store, s':>9} {'read, MiB/s':>12}")
+        for method in ["none", "zlib", "lzma"]:
+            sizes, stored, read = benchmark(method, directory, values)
+            ratios = " ".join(f"{raw[kind] / sizes[kind]:>14.2f}" for kind in values)
+            print(f"{method:>8} {ratios} {stored:>9.2f} {sum(raw.values()) / 2**20 / read:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
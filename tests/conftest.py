@@ -3,6 +3,17 @@
 import pytest
 
 import hworker.config
+import hworker.depot
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--depot-backend", default="sqlite", choices=["sqlite", "memory"], help="depot backend to run tests with"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "sqlite: test needs SQLite depot backend whatever backend is chosen")
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -13,9 +24,16 @@ def global_user_config(tmp_path_factory):
 
 
 @pytest.fixture(scope="session", autouse=True)
-def database_test(tmp_path_factory):
+def database_test(tmp_path_factory, pytestconfig):
     import hworker.depot.database.common as common
 
     database_name = (tmp_path_factory.getbasetemp() / "test.db").as_posix()
 
     common._database_path = database_name
+    hworker.depot._backend_name = pytestconfig.getoption("depot_backend")
+
+
+@pytest.fixture(autouse=True)
+def sqlite_backend(request, monkeypatch):
+    if request.node.get_closest_marker("sqlite"):
+        monkeypatch.setattr(hworker.depot, "_backend_name", "sqlite")
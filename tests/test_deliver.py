@@ -3,9 +3,12 @@
 import pytest
 from git import Repo
 
+import hworker.deliver.git as deliver_git
+import hworker.depot
 from hworker import config
 from hworker.deliver.git import get_homework_content
-from hworker.depot.objects import FileObject
+from hworker.depot import delete, search
+from hworker.depot.objects import FileObject, Homework, UpdateTime
 
 
 @pytest.fixture()
@@ -37,3 +40,16 @@ class TestDeliverGit:
             "check/1.in": FileObject(b"123, 345", content["check/1.in"].timestamp),
             "check/1.out": FileObject(b"345", content["check/1.out"].timestamp),
         }
+
+    def test_download_all_memory(self, example_git_repo, monkeypatch):
+        repo, repo_path, commit = example_git_repo
+        monkeypatch.setattr(hworker.depot, "_backend_name", "memory")
+        monkeypatch.setattr(deliver_git, "update_all", lambda: None)
+        monkeypatch.setattr(deliver_git, "local_path", lambda student_id: str(repo_path))
+        monkeypatch.setattr(deliver_git, "get_git_uids", lambda: ["user1", "user2"])
+        monkeypatch.setattr(deliver_git, "get_tasks_list", lambda: ["task"])
+        monkeypatch.setattr(deliver_git, "get_task_info", lambda task: {})
+        deliver_git.download_all()
+        assert sorted(homework.USER_ID for homework in search(Homework)) == ["user1", "user2"]
+        delete(Homework)
+        delete(UpdateTime)
@@ -1,11 +1,62 @@
 """Tests for depot"""
+import asyncio
 import datetime
+import io
+import json
+import multiprocessing
+import pickle
+import tarfile
 
 import pytest
+from sqlalchemy import create_engine, event, exc, func, select
 
-
-from hworker.depot import store, delete, search
-from hworker.depot.objects import Homework, Criteria, is_field, FileObject
+import hworker.config
+import hworker.depot
+from hworker.depot import (
+    aio,
+    aggregate,
+    cache,
+    changes,
+    get_cursor,
+    last_seq,
+    set_cursor,
+    store,
+    store_many,
+    delete,
+    delete_versions,
+    fulltext,
+    maintain,
+    search,
+    search_many,
+    single_writer,
+    stats,
+    snapshot,
+    restore,
+    performance_profile,
+    writer,
+    get_stats,
+)
+from hworker.depot.database import Base, get_engine
+from hworker.depot.database import compression, external, filetable, models
+from hworker.depot.database.blobs import content_hash
+from hworker.depot.database.common import _sqlite_max_variables
+from hworker.depot.database.migrations import upgrade
+from hworker.depot.database.models import blob_table, journal_table, latest_version_table
+from hworker.depot.objects import (
+    Homework,
+    Criteria,
+    is_field,
+    FileObject,
+    TaskScore,
+    UserScore,
+    CheckResult,
+    Check,
+    CheckCategoryEnum,
+    Solution,
+    RawData,
+    FileMatch,
+    Plagiary,
+)
 
 
 class TestDepotFunctions:
@@ -38,6 +89,101 @@ class TestDepotFunctions:
         delete(Homework)
         assert len(list(search(Homework))) == 0
 
+    def test_store_replace(self):
+        store(TaskScore(ID="1", USER_ID="11", TASK_ID="12", timestamp=1, name="old", rating=1))
+        store(TaskScore(ID="1", USER_ID="11", TASK_ID="12", timestamp=2, name="new", rating=2))
+        assert [score.name for score in search(TaskScore)] == ["new"]
+        store(Homework(ID="10", USER_ID="11", TASK_ID="12", timestamp=1, content={}, is_broken=False))
+        store(Homework(ID="10", USER_ID="11", TASK_ID="12", timestamp=1, content={}, is_broken=True))
+        store(Homework(ID="10", USER_ID="11", TASK_ID="12", timestamp=2, content={}, is_broken=False))
+        assert [hw.is_broken for hw in search(Homework)] == [False, True]
+        delete(TaskScore)
+        delete(Homework)
+
+    def test_store_many(self):
+        scores = [
+            TaskScore(ID=f"{i % 5}", USER_ID="11", TASK_ID="12", timestamp=i, name=f"{i}", rating=i) for i in range(10)
+        ]
+        homeworks = [
+            Homework(ID="10", USER_ID="11", TASK_ID="12", timestamp=i % 3, content={}, is_broken=False)
+            for i in range(5)
+        ]
+        store_many(scores + homeworks)
+        assert sorted(score.name for score in search(TaskScore)) == ["5", "6", "7", "8", "9"]
+        assert len(list(search(Homework))) == 3
+        delete(TaskScore)
+        delete(Homework)
+
+    @pytest.mark.sqlite
+    def test_store_deduplicated_content(self):
+        def count_blobs():
+            with get_engine().connect() as connection:
+                return connection.execute(select(func.count()).select_from(blob_table)).scalar()
+
+        blobs_before = count_blobs()
+        store_many(
+            Homework(
+                ID="10",
+                USER_ID="11",
+                TASK_ID="12",
+                timestamp=i,
+                content={"prog.py": FileObject(b"same old", 0), "new.py": FileObject(f"new {i}".encode(), i)},
+                is_broken=False,
+            )
+            for i in range(3)
+        )
+        store(Solution(ID="10", USER_ID="11", TASK_ID="12", timestamp=0, content={"prog.py": b"same old"}, checks={}))
+        assert count_blobs() - blobs_before == 4
+        assert [hw.content["new.py"] for hw in search(Homework)] == [
+            FileObject(f"new {i}".encode(), i) for i in (2, 1, 0)
+        ]
+        assert search(Solution, first=True).content == {"prog.py": b"same old"}
+        delete(Homework)
+        delete(Solution)
+
+    def test_checks_are_dicts(self):
+        checks = {"check": ["arg", {"timeout": 1}]}
+        store(Solution(ID="10", USER_ID="11", TASK_ID="12", timestamp=0, content={"prog.py": b"1"}, checks=checks))
+        store(
+            Check(
+                ID="13",
+                USER_ID="11",
+                TASK_ID="12",
+                timestamp=0,
+                content={"check.py": b"2"},
+                category=CheckCategoryEnum.runtime,
+            )
+        )
+        assert search(Solution, first=True).checks | {} == checks
+        assert search(Check, first=True).content | {} == {"check.py": b"2"}
+        delete(Solution)
+        delete(Check)
+
+    @pytest.mark.sqlite
+    def test_batched_content_load(self, executed_queries):
+        store_many(
+            Homework(
+                ID=f"{i}",
+                USER_ID="11",
+                TASK_ID="12",
+                timestamp=i,
+                content={"prog.py": FileObject(f"{i}".encode(), i)},
+                is_broken=False,
+            )
+            for i in range(5)
+        )
+        found = search(Homework, yield_per=3)
+        assert [next(found).content["prog.py"].content for _ in range(4)] == [b"4", b"3", b"2", b"1"]
+        # file bodies of every fetched chunk are loaded by one query
+        assert sum("FROM blob" in statement for statement, parameters in executed_queries) == 2
+        found.close()
+        delete(Homework)
+
+    def test_store_many_fail(self):
+        with pytest.raises(ValueError):
+            store_many([self.h1, Homework(ID="10", USER_ID="11", TASK_ID="12", timestamp=12345)])
+        assert len(list(search(Homework))) == 0
+
 
 @pytest.fixture
 def homeworks():
@@ -64,6 +210,26 @@ class TestComparison:
         assert not is_field("method", bin)
         assert not is_field("_special", 1)
 
+    def test_fields(self):
+        homework = Homework(ID="ID", USER_ID="U", TASK_ID="T", timestamp=1, content={}, is_broken=False)
+        assert not hasattr(homework, "__dict__")
+        assert [name for name, value in homework] == ["ID", "TASK_ID", "USER_ID", "content", "is_broken", "timestamp"]
+        assert list(homework.keys()) == ["ID", "TASK_ID", "USER_ID", "timestamp"]
+        assert homework[3] == ("content", {})
+        assert pickle.loads(pickle.dumps(homework)) == homework
+
+    def test_default_fields(self):
+        plagiary = Plagiary()
+        assert list(plagiary) == [
+            ("ID", None),
+            ("TASK_ID", None),
+            ("USER_ID", None),
+            ("content", None),
+            ("timestamp", None),
+        ]
+        assert plagiary == Plagiary()
+        assert repr(plagiary)
+
     def test_equals(self, homeworks):
         hw, hw2 = list(search(Homework))[:2]
         assert hw == hw
@@ -147,6 +313,69 @@ class TestSearchOptionals:
             ]
         )
 
+    def test_search_stream(self, homeworks_with_versions):
+        assert len(list(search(Homework, yield_per=2))) == 27
+        found = search(Homework, yield_per=2)
+        assert isinstance(next(found), Homework)
+        found.close()
+        delete(Homework)
+        assert next(search(Homework), None) is None
+
+    @pytest.mark.sqlite
+    def test_return_fields_projection(self, homeworks_with_versions, executed_queries):
+        assert {hw.ID for hw in search(Homework, actual=True, return_fields=["ID"])} == {
+            f"t{user_id}{task_id}" for user_id in ["Vania", "Petya", "Vasili"] for task_id in ["01", "02", "03"]
+        }
+        assert all("content" not in statement for statement, parameters in executed_queries)
+        with pytest.raises(ValueError):
+            search(Homework, return_fields=["ID", "no_such_field"])
+
+    def test_actual_follows_changes(self, homeworks_with_versions):
+        store(Homework(ID="tVania01", USER_ID="Vania", TASK_ID="01", timestamp=5, content={}, is_broken=False))
+        assert search(Homework, Criteria("ID", "==", "tVania01"), actual=True, first=True).timestamp == 30
+
+        delete(Homework, Criteria("timestamp", "==", 30))
+        assert {item.timestamp for item in search(Homework, actual=True)} == {20}
+        delete(Homework, Criteria("USER_ID", "==", "Vania"))
+        assert len(list(search(Homework, actual=True))) == 6
+
+    def test_actual_with_version_criteria(self, homeworks_with_versions):
+        assert {item.timestamp for item in search(Homework, Criteria("timestamp", "<", 30), actual=True)} == {20}
+
+    def test_as_of(self, homeworks_with_versions):
+        assert search(Homework, Criteria("ID", "==", "tVania01"), as_of=25, first=True).timestamp == 20
+        assert search(Homework, Criteria("ID", "==", "tVania01"), as_of=5, first=True) is None
+        found = list(search(Homework, Criteria("TASK_ID", "==", "02"), as_of=10))
+        assert sorted(item.ID for item in found) == ["tPetya02", "tVania02", "tVasili02"]
+        assert {item.timestamp for item in found} == {10}
+        assert len(list(search(Homework, as_of=30))) == 9
+        # cached latest version must not be returned for the past
+        assert search(Homework, Criteria("ID", "==", "tVania01"), first=True).timestamp == 30
+        assert search(Homework, Criteria("ID", "==", "tVania01"), as_of=20, first=True).timestamp == 20
+
+    def test_delete_versions(self, homeworks_with_versions):
+        delete_versions(Homework, [("tVania01", 30), ("tVania01", 20), ("tPetya02", 10)])
+        assert len(list(search(Homework))) == 24
+        assert search(Homework, Criteria("ID", "==", "tVania01"), actual=True, first=True).timestamp == 10
+
+    def test_search_many(self, homeworks_with_versions):
+        ids = ["tVania01", "tPetya02", "nothing"] + [f"absent{i}" for i in range(2000)]
+        found = search_many(Homework, ids)
+        assert set(found) == {"tVania01", "tPetya02"}
+        assert found["tVania01"].timestamp == 30
+        versions = search_many(Homework, ids, actual=False, return_fields=["timestamp"])
+        assert [item.timestamp for item in versions["tPetya02"]] == [30, 20, 10]
+        assert versions["tPetya02"][0].ID == "tPetya02"
+        assert set(search_many(Homework, ids, Criteria("USER_ID", "==", "Vania"))) == {"tVania01"}
+
+    @pytest.mark.sqlite
+    def test_search_many_parameters(self, homeworks_with_versions, executed_queries):
+        ids = ["tVania01"] + [f"absent{i}" for i in range(2000)]
+        users = Criteria("USER_ID", "in", ["Vania"] + [f"absent{i}" for i in range(500)])
+        either = Criteria.any_of(Criteria("timestamp", "between", (0, 100)), Criteria("TASK_ID", "is not null"))
+        assert set(search_many(Homework, ids, users, either)) == {"tVania01"}
+        assert all(len(parameters) <= _sqlite_max_variables for statement, parameters in executed_queries)
+
     def test_actual_and_return_fields(self, homeworks_with_versions):
         fields = ["ID", "timestamp"]
         assert all(
@@ -157,3 +386,649 @@ class TestSearchOptionals:
         )
         assert len(list(search(Homework, actual=True))) == 9
         assert all(item.timestamp == 30 for item in search(Homework, actual=True))
+
+
+class TestAggregate:
+    @pytest.fixture
+    def task_scores(self):
+        store_many(
+            TaskScore(ID=f"{user}/{task}/score", USER_ID=user, TASK_ID=task, timestamp=1, name="score", rating=rating)
+            for user, task, rating in [("u1", "t1", 1), ("u1", "t2", 3), ("u2", "t1", 5), ("u2", "t2", 7)]
+        )
+        yield
+        delete(TaskScore)
+
+    def test_total(self, task_scores):
+        assert aggregate(TaskScore, metrics={"rating": "avg", "ID": "count"}) == [{"rating": 4, "ID": 4}]
+        assert aggregate(TaskScore, Criteria("USER_ID", "==", "u2"), metrics={"rating": "min"}) == [{"rating": 5}]
+
+    def test_group_by(self, task_scores):
+        found = aggregate(TaskScore, group_by=["USER_ID"], metrics={"rating": "max", "TASK_ID": "count"})
+        assert sorted(found, key=lambda row: row["USER_ID"]) == [
+            {"USER_ID": "u1", "rating": 3, "TASK_ID": 2},
+            {"USER_ID": "u2", "rating": 7, "TASK_ID": 2},
+        ]
+
+    def test_actual(self, homeworks_with_versions):
+        assert aggregate(Homework, metrics={"timestamp": "avg"}, actual=True) == [{"timestamp": 30}]
+        assert aggregate(Homework, metrics={"timestamp": "avg"}) == [{"timestamp": 20}]
+
+    def test_wrong_function(self):
+        with pytest.raises(ValueError):
+            aggregate(TaskScore, metrics={"rating": "median"})
+
+    def test_grouped_metric(self):
+        with pytest.raises(ValueError):
+            aggregate(TaskScore, group_by=["USER_ID"], metrics={"USER_ID": "count"})
+
+
+class TestCriteria:
+    @pytest.fixture(autouse=True)
+    def task_scores(self):
+        store_many(
+            TaskScore(ID=f"{user}/{task}/score", USER_ID=user, TASK_ID=task, timestamp=1, name="score", rating=rating)
+            for user, task, rating in [("u1", "t1", 1), ("u1", "t2", 3), ("u2", "t1", 5), ("u2", "t2", 7)]
+        )
+        yield
+        delete(TaskScore)
+
+    @staticmethod
+    def found(*criteria: Criteria) -> list[str]:
+        return sorted(score.ID for score in search(TaskScore, *criteria, actual=True))
+
+    def test_conditions(self):
+        assert self.found(Criteria("rating", "in", [1, 7, 8])) == ["u1/t1/score", "u2/t2/score"]
+        assert self.found(Criteria("TASK_ID", "not in", ("t1",))) == ["u1/t2/score", "u2/t2/score"]
+        assert self.found(Criteria("rating", "between", (3, 5))) == ["u1/t2/score", "u2/t1/score"]
+        assert self.found(Criteria("ID", "regexp", r"^u\d/t1/")) == ["u1/t1/score", "u2/t1/score"]
+        assert self.found(Criteria("ID", "is null")) == []
+        assert len(self.found(Criteria("ID", "is not null"))) == 4
+
+    def test_any_of(self):
+        group = Criteria.any_of(
+            Criteria("rating", "==", 1), [Criteria("USER_ID", "==", "u2"), Criteria("TASK_ID", "==", "t2")]
+        )
+        assert group.field_names() == {"rating", "USER_ID", "TASK_ID"}
+        assert self.found(group) == ["u1/t1/score", "u2/t2/score"]
+        assert self.found(group, Criteria("TASK_ID", "==", "t2")) == ["u2/t2/score"]
+        delete(TaskScore, group)
+        assert self.found() == ["u1/t2/score", "u2/t1/score"]
+
+    def test_wrong(self):
+        with pytest.raises(ValueError):
+            Criteria("ID", "regexp", "(")
+        with pytest.raises(ValueError):
+            Criteria("rating", "between", (1, 2, 3))
+
+
+class TestAsyncio:
+    def test_search(self, homeworks_with_versions):
+        async def collect():
+            return await asyncio.gather(
+                aio.search(Homework, Criteria("USER_ID", "==", "Vania"), actual=True),
+                aio.first(Homework, Criteria("ID", "==", "tPetya02")),
+                aio.first(Homework, Criteria("ID", "==", "nothing")),
+                aio.search_many(Homework, ["tVania01", "tPetya02"]),
+                aio.aggregate(Homework, group_by=["USER_ID"], metrics={"ID": "count"}, actual=True),
+            )
+
+        found, first, nothing, many, counts = asyncio.run(collect())
+        assert [hw.ID for hw in found] == [
+            hw.ID for hw in search(Homework, Criteria("USER_ID", "==", "Vania"), actual=True)
+        ]
+        assert first == search(Homework, Criteria("ID", "==", "tPetya02"), first=True)
+        assert nothing is None
+        assert set(many) == {"tVania01", "tPetya02"}
+        assert sorted(row["ID"] for row in counts) == [3, 3, 3]
+
+
+def store_scores(user: str) -> None:
+    for timestamp in range(10):
+        store(
+            TaskScore(ID=f"{user}/score", USER_ID=user, TASK_ID="task", timestamp=timestamp, name="s", rating=timestamp)
+        )
+
+
+@pytest.mark.sqlite
+class TestSingleWriter:
+    def test_workers(self):
+        users = [f"user{i}" for i in range(8)]
+        with single_writer(batch_size=16):
+            assert writer.is_active()
+            with multiprocessing.get_context("fork").Pool(4) as pool:
+                pool.map(store_scores, users)
+            store(TaskScore(ID="parent/score", USER_ID="parent", TASK_ID="task", timestamp=1, name="s", rating=1))
+        assert not writer.is_active()
+        assert sorted(score.USER_ID for score in search(TaskScore)) == sorted(users + ["parent"])
+        assert {score.rating for score in search(TaskScore)} == {9, 1}
+        delete(TaskScore)
+
+    def test_memory_backend(self, monkeypatch):
+        monkeypatch.setattr(hworker.depot, "_backend_name", "memory")
+        with single_writer():
+            assert not writer.is_active()
+
+    def test_cache(self):
+        score = TaskScore(ID="cached/score", USER_ID="user", TASK_ID="task", timestamp=1, name="s", rating=1)
+        store(score)
+        with cache.enabled():
+            assert search(TaskScore, Criteria("ID", "==", score.ID), first=True).rating == 1
+            with single_writer():
+                assert not cache.is_enabled()
+                store(TaskScore(**{**dict(iter(score)), "rating": 2}))
+            assert search(TaskScore, Criteria("ID", "==", score.ID), first=True).rating == 2
+        delete(TaskScore)
+
+
+class TestJournal:
+    def test_changes(self):
+        since = last_seq()
+        store(TaskScore(ID="journal", USER_ID="user", TASK_ID="task", timestamp=1, name="score", rating=1))
+        store_many(
+            [
+                TaskScore(ID="journal", USER_ID="user", TASK_ID="task", timestamp=2, name="score", rating=2),
+                UserScore(ID="journal", USER_ID="user", TASK_ID="task", timestamp=1, name="score", rating=1),
+            ]
+        )
+        delete(TaskScore, Criteria("ID", "==", "journal"))
+        found = changes(since)
+        assert [(change.type, change.ID, change.timestamp, change.op) for change in found] == [
+            (TaskScore, "journal", 1, "store"),
+            (TaskScore, "journal", 2, "store"),
+            (UserScore, "journal", 1, "store"),
+            (TaskScore, "journal", 2, "delete"),
+        ]
+        assert [change.seq for change in found] == sorted(change.seq for change in found)
+        assert [change.type for change in changes(since, types=[UserScore])] == [UserScore]
+        assert changes(found[-1].seq) == []
+        delete(UserScore)
+
+    def test_delete_versions(self, homeworks_with_versions):
+        since = last_seq()
+        delete_versions(Homework, [("tVania01", 10), ("tVania01", 20), ("no such homework", 10)])
+        assert sorted((change.ID, change.timestamp, change.op) for change in changes(since)) == [
+            ("tVania01", 10, "delete"),
+            ("tVania01", 20, "delete"),
+        ]
+
+    def test_cursors(self):
+        assert get_cursor("test consumer") == 0
+        store(UserScore(ID="journal", USER_ID="user", TASK_ID="task", timestamp=1, name="score", rating=1))
+        seq = last_seq()
+        set_cursor("test consumer", seq)
+        set_cursor("other consumer", seq - 1)
+        assert get_cursor("test consumer") == seq
+        maintain()
+        assert [change.seq for change in changes()] == [seq]
+        set_cursor("other consumer", seq)
+        maintain()
+        assert changes() == []
+        store(UserScore(ID="journal", USER_ID="user", TASK_ID="task", timestamp=2, name="score", rating=1))
+        assert last_seq() > seq
+        delete(UserScore)
+
+    def test_table_cursors(self):
+        store(UserScore(ID="journal", USER_ID="user", TASK_ID="task", timestamp=1, name="score", rating=1))
+        store(TaskScore(ID="journal", USER_ID="user", TASK_ID="task", timestamp=1, name="score", rating=1))
+        seq = last_seq()
+        set_cursor("test consumer", seq - 2, types=[UserScore])
+        set_cursor("other consumer", seq, types=[UserScore])
+        maintain()
+        # nobody reads task scores, so their changes are dropped
+        assert [(change.type, change.seq) for change in changes(seq - 2)] == [(UserScore, seq - 1)]
+        set_cursor("test consumer", seq, types=[UserScore])
+        maintain()
+        assert changes() == []
+        assert last_seq() == seq
+        delete(TaskScore)
+        delete(UserScore)
+
+
+@pytest.mark.sqlite
+class TestMaintenance:
+    def test_maintain(self):
+        homework = Homework(
+            ID="gc", USER_ID="user", TASK_ID="task", timestamp=1, content={"a": FileObject(b"gc", 0)}, is_broken=False
+        )
+        store(homework)
+        delete(Homework, Criteria("ID", "==", "gc"))
+        report = maintain()
+        with get_engine().connect() as connection:
+            assert (
+                connection.execute(select(blob_table).where(blob_table.c.hash == content_hash(b"gc"))).first() is None
+            )
+        assert report["homework"][0] == 0
+        assert report["blob"][1] > 0
+
+
+@pytest.mark.sqlite
+class TestExternalBinary:
+    @pytest.fixture(autouse=True)
+    def threshold(self, monkeypatch):
+        monkeypatch.setitem(hworker.config.get_depot_info(), "external_threshold", 16)
+
+    def test_round_trip(self):
+        content = b"large value " * 100
+        store(RawData(ID="large", USER_ID="user", TASK_ID="task", timestamp=1, content=content))
+        store(RawData(ID="small", USER_ID="user", TASK_ID="task", timestamp=1, content=b"small"))
+        found = search(RawData, Criteria("ID", "==", "large"), first=True)
+        assert type(found.content) is bytes
+        assert found.content == content
+        assert search(RawData, Criteria("ID", "==", "small"), first=True).content == b"small"
+        with get_engine().connect() as connection:
+            raw = connection.scalar(
+                select(func.length(models.RawData.__table__.c.content)).where(models.RawData.ID == "large")
+            )
+        assert raw == len(external.MARK) + 32
+        assert len(list(external.directory().glob("*/*"))) == 1
+        delete(RawData)
+
+    def test_file_bodies(self):
+        content = b"print('large solution')\n" * 100
+        store(Solution(ID="ext", USER_ID="user", TASK_ID="task", timestamp=1, content={"prog.py": content}, checks={}))
+        found = search(Solution, Criteria("ID", "==", "ext"), first=True).content["prog.py"]
+        assert found == content
+        assert b"large" in found and found.split() == content.split()
+        delete(Solution)
+
+    def test_reference_like_value(self, monkeypatch):
+        monkeypatch.setitem(hworker.config.get_depot_info(), "external_threshold", 0)
+        content = external.MARK + bytes(32)
+        store(RawData(ID="fake", USER_ID="user", TASK_ID="task", timestamp=1, content=content))
+        assert search(RawData, Criteria("ID", "==", "fake"), first=True).content == content
+        delete(RawData)
+
+    @pytest.mark.parametrize("method", ["zlib", "lzma"])
+    def test_compressed_files(self, monkeypatch, method):
+        monkeypatch.setitem(hworker.config.get_depot_info(), "compression", method)
+        content = b"".join(b"test %d passed\n" % i for i in range(10000))
+        before = set(external.directory().glob("*/*"))
+        store(RawData(ID="large", USER_ID="user", TASK_ID="task", timestamp=1, content=content))
+        [path] = set(external.directory().glob("*/*")) - before
+        assert path.stat().st_size < len(content) / 4
+        assert search(RawData, Criteria("ID", "==", "large"), first=True).content == content
+        # files written before compression are read as they are
+        path.write_bytes(content)
+        assert search(RawData, Criteria("ID", "==", "large"), first=True).content == content
+        delete(RawData)
+        maintain()
+
+    def test_collect_garbage(self):
+        store(RawData(ID="large", USER_ID="user", TASK_ID="task", timestamp=1, content=b"garbage" * 100))
+        delete(RawData)
+        maintain()
+        assert not list(external.directory().glob("*/*"))
+
+
+class TestCompression:
+    @pytest.mark.parametrize("method", ["none", "zlib", "lzma"])
+    def test_round_trip(self, method):
+        for value in [b"", b"short", b"terminal log line\n" * 100, b"HWC\x01looks compressed", memoryview(b"HWC")]:
+            assert compression.decompress(compression.compress(value, method, 16)) == value
+
+    def test_compress(self):
+        value = b"terminal log line\n" * 100
+        assert compression.compress(value, "zlib", 16)[:4] == b"HWC\x01"
+        assert compression.compress(value, "lzma", 16)[:4] == b"HWC\x02"
+        assert compression.compress(value, "zlib", len(value) + 1) is value
+        assert compression.compress(b"\x00\xff", "zlib") == b"\x00\xff"
+        assert compression.decompress(b"stored before compression") == b"stored before compression"
+        with pytest.raises(ValueError):
+            compression.compress(value, "zip")
+
+    @pytest.mark.sqlite
+    @pytest.mark.parametrize("method", ["none", "zlib", "lzma"])
+    def test_columns(self, method, monkeypatch):
+        monkeypatch.setitem(hworker.config.get_depot_info(), "compression", method)
+        content = b"program output\n" * 1000
+        store(RawData(ID="compressed", USER_ID="user", TASK_ID="task", timestamp=1, content=content))
+        assert search(RawData, first=True).content == content
+        with get_engine().connect() as connection:
+            raw = connection.scalar(select(func.length(models.RawData.__table__.c.content)))
+        assert (raw == len(content)) == (method == "none")
+        delete(RawData)
+
+
+@pytest.mark.sqlite
+class TestSnapshot:
+    @pytest.fixture(autouse=True)
+    def threshold(self, monkeypatch):
+        monkeypatch.setitem(hworker.config.get_depot_info(), "external_threshold", 16)
+
+    def test_restore(self, tmp_path):
+        content = b"large value " * 100
+        store(RawData(ID="large", USER_ID="user", TASK_ID="task", timestamp=1, content=content))
+        store(RawData(ID="small", USER_ID="user", TASK_ID="task", timestamp=1, content=b"small"))
+        manifest = snapshot(tmp_path / "depot.tar")
+        assert manifest["tables"]["rawdata"] == 2
+        assert len([name for name in manifest["files"] if name.startswith("blobs/")]) == 1
+
+        delete(RawData)
+        maintain()
+        assert not list(search(RawData))
+        assert restore(tmp_path / "depot.tar") == manifest
+        assert search(RawData, Criteria("ID", "==", "large"), first=True).content == content
+        assert search(RawData, Criteria("ID", "==", "small"), first=True).content == b"small"
+        delete(RawData)
+
+    def test_damaged(self, tmp_path, monkeypatch):
+        # uncompressed archives can be appended to
+        monkeypatch.setitem(hworker.config.get_depot_info(), "compression", "none")
+        store(RawData(ID="large", USER_ID="user", TASK_ID="task", timestamp=1, content=b"large value " * 100))
+        manifest = snapshot(tmp_path / "depot.tar")
+        delete(RawData)
+        manifest["files"]["depot.db"] = "0" * 64
+        with tarfile.open(tmp_path / "depot.tar", "a") as archive:
+            data = json.dumps(manifest).encode()
+            info = tarfile.TarInfo("manifest.json")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        with pytest.raises(ValueError):
+            restore(tmp_path / "depot.tar")
+        assert not list(search(RawData))
+
+
+def test_memory_snapshot(tmp_path):
+    with pytest.raises(ValueError):
+        hworker.depot.memory.snapshot(tmp_path / "depot.tar")
+    with pytest.raises(ValueError):
+        hworker.depot.memory.restore(tmp_path / "depot.tar")
+
+
+class TestFulltext:
+    @staticmethod
+    def solution(ID: str, timestamp: float, content: dict[str, bytes], task: str = "task") -> Solution:
+        return Solution(ID=ID, USER_ID="user", TASK_ID=task, timestamp=timestamp, content=content, checks={})
+
+    @pytest.fixture(autouse=True)
+    def clean(self):
+        yield
+        delete(Solution)
+
+    def test_fulltext(self):
+        store_many(
+            [
+                self.solution("user:task", 1, {"prog.py": b"import numpy\nprint(eval(input()))"}),
+                self.solution("user:task", 2, {"prog.py": b"print(int(input()))", "README": b"no_eval here"}),
+                self.solution("user:other", 1, {"prog.py": b"x = eval(input())", "data.bin": b"\xff eval"}, "other"),
+            ]
+        )
+        assert fulltext("eval") == [FileMatch("user:other", "user", "other", 1, "prog.py")]
+        assert fulltext("eval", task="task") == []
+        assert fulltext("eval", task="task", actual=False) == [FileMatch("user:task", "user", "task", 1, "prog.py")]
+        assert [match.ID for match in fulltext("numpy", actual=False)] == ["user:task"]
+        assert [match.path for match in fulltext("no_eval")] == ["README"]
+        assert [match.ID for match in fulltext("INPUT")] == ["user:task", "user:other"]
+        assert [match.ID for match in fulltext("print input")] == ["user:task"]
+        assert [match.ID for match in fulltext("num*", actual=False)] == ["user:task"]
+
+    def test_delete(self):
+        store(self.solution("user:task", 1, {"prog.py": b"eval"}))
+        store(self.solution("user:task", 2, {"prog.py": b"eval"}))
+        delete_versions(Solution, [("user:task", 2)])
+        assert [match.timestamp for match in fulltext("eval")] == [1]
+        store(self.solution("user:task", 1, {"prog.py": b"exec"}))
+        assert fulltext("eval") == []
+        delete(Solution)
+        assert fulltext("exec", actual=False) == []
+
+    def test_wrong_query(self):
+        with pytest.raises(ValueError):
+            fulltext('"unclosed')
+
+    @pytest.mark.sqlite
+    def test_index(self):
+        maintain()
+        content = {"prog.py": b"eval", "copy.py": b"eval"}
+        store_many(self.solution(f"user{i}:task", 1, content) for i in range(3))
+        with get_engine().connect() as connection:
+            assert connection.execute(select(func.count()).select_from(models.solution_file_table)).scalar() == 6
+            assert connection.execute(select(func.count()).select_from(models.solution_text_table)).scalar() == 1
+        delete(Solution)
+        maintain()
+        with get_engine().connect() as connection:
+            assert connection.execute(select(func.count()).select_from(models.solution_text_table)).scalar() == 0
+
+
+class TestStats:
+    @pytest.fixture(autouse=True)
+    def clean(self):
+        stats.reset()
+        yield
+        delete(RawData)
+        stats.reset()
+
+    def test_counters(self):
+        store_many(RawData(ID=f"ID{i}", USER_ID="user", TASK_ID="task", timestamp=1, content=b"") for i in range(3))
+        found = search(RawData, Criteria("USER_ID", "==", "user"), Criteria("timestamp", ">", 0))
+        # search is counted when its results are read
+        assert list(get_stats()) == ["store_many RawData []"]
+        assert get_stats()["store_many RawData []"]["rows"] == 3
+        assert len(list(found)) == 3
+        search(RawData, Criteria("ID", "==", "ID0"), first=True)
+        search(RawData, Criteria("ID", "==", "ID4"), first=True)
+
+        counters = get_stats()
+        assert counters["search RawData [USER_ID ==, timestamp >]"]["rows"] == 3
+        assert counters["search RawData [ID ==]"]["count"] == 2
+        assert counters["search RawData [ID ==]"]["rows"] == 1
+        assert all(0 <= value["max"] <= value["total"] for value in counters.values())
+
+    @pytest.mark.sqlite
+    def test_slow_query(self, monkeypatch, caplog):
+        monkeypatch.setitem(hworker.config.get_depot_info(), "slow_query_threshold", 1e-9)
+        search(RawData, Criteria("ID", "==", "slow"), first=True)
+        assert any("Slow query" in message and "FROM rawdata" in message for message in caplog.messages)
+
+    @pytest.mark.sqlite
+    def test_failed_query(self, monkeypatch, caplog):
+        monkeypatch.setitem(hworker.config.get_depot_info(), "slow_query_threshold", 1e-9)
+        with get_engine().connect() as connection:
+            with pytest.raises(exc.OperationalError):
+                connection.exec_driver_sql("SELECT * FROM no_such_table")
+            assert not connection.info.get("query_start")
+            connection.exec_driver_sql("SELECT 1")
+        assert any("Slow query" in message and "SELECT 1" in message for message in caplog.messages)
+
+
+@pytest.mark.sqlite
+class TestIdentityCache:
+    check = Check(
+        ID="user:task/check",
+        USER_ID="user",
+        TASK_ID="task",
+        timestamp=1,
+        content={},
+        category=CheckCategoryEnum.runtime,
+    )
+
+    def test_lookup(self, executed_queries):
+        store(self.check)
+        with cache.enabled(maxsize=2):
+            first = search(Check, Criteria("ID", "==", self.check.ID), first=True)
+            executed_queries.clear()
+            assert search(Check, Criteria("ID", "==", self.check.ID), first=True) == first
+            assert not executed_queries
+            assert search(Check, Criteria("ID", "==", "no such check"), first=True) is None
+            assert search(Check, Criteria("ID", "==", "no such check"), first=True) is None
+            assert cache.info() == (2, 2, 2, 2)
+            search(Check, Criteria("ID", "==", "other check"), first=True)
+            assert cache.info().currsize == 2
+        assert cache.info() == (0, 0, 0, 0)
+        delete(Check)
+
+    def test_search_many(self, executed_queries):
+        store(self.check)
+        with cache.enabled():
+            assert set(search_many(Check, [self.check.ID, "no such check"])) == {self.check.ID}
+            executed_queries.clear()
+            assert search(Check, Criteria("ID", "==", "no such check"), first=True) is None
+            found = search_many(Check, [self.check.ID])
+            assert search_many(Check, [self.check.ID])[self.check.ID] == found[self.check.ID]
+            assert not executed_queries
+        delete(Check)
+
+    def test_copies(self):
+        store(self.check)
+        with cache.enabled():
+            search(Check, Criteria("ID", "==", self.check.ID), first=True).timestamp = 2
+            found = search(Check, Criteria("ID", "==", self.check.ID), first=True)
+            assert found.timestamp == 1
+            found.content["changed"] = "content"
+            assert search(Check, Criteria("ID", "==", self.check.ID), first=True) == self.check
+        delete(Check)
+
+    def test_invalidate(self):
+        with cache.enabled():
+            store(self.check)
+            assert search(Check, Criteria("ID", "==", self.check.ID), first=True).timestamp == 1
+            store(Check(**{**dict(iter(self.check)), "timestamp": 2}))
+            assert search(Check, Criteria("ID", "==", self.check.ID), first=True).timestamp == 2
+            delete(Check)
+            assert search(Check, Criteria("ID", "==", self.check.ID), first=True) is None
+
+    def test_disabled(self):
+        store(self.check)
+        search(Check, Criteria("ID", "==", self.check.ID), first=True)
+        assert cache.info() == (0, 0, 0, 0)
+        delete(Check)
+
+
+@pytest.mark.sqlite
+class TestPerformanceProfile:
+    @staticmethod
+    def pragma(name):
+        with get_engine().connect() as connection:
+            return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    def test_switch(self):
+        assert self.pragma("journal_mode") == "wal"
+        assert self.pragma("synchronous") == 1
+        with performance_profile("bulk-ingest"):
+            assert self.pragma("synchronous") == 0
+            assert self.pragma("wal_autocheckpoint") == 10000
+        assert self.pragma("synchronous") == 1
+
+    def test_unknown(self):
+        with pytest.raises(KeyError):
+            with performance_profile("no such profile"):
+                pass
+        assert self.pragma("synchronous") == 1
+
+    def test_other_engines(self, tmp_path):
+        with create_engine(f"sqlite:///{tmp_path / 'other.db'}").connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+
+
+@pytest.fixture
+def executed_queries():
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        queries.append((statement, parameters))
+
+    event.listen(get_engine(), "before_cursor_execute", record)
+    yield queries
+    event.remove(get_engine(), "before_cursor_execute", record)
+
+
+@pytest.mark.sqlite
+class TestQueryPlans:
+    shapes = [
+        (Homework, [], {"actual": True}),
+        (Homework, [Criteria("USER_ID", "==", "user"), Criteria("TASK_ID", "==", "task")], {}),
+        (Solution, [Criteria("ID", "==", "user:task")], {}),
+        (Solution, [Criteria("ID", "==", "user:task")], {"actual": True, "first": True}),
+        (Check, [Criteria("ID", "==", "user:task/check")], {"first": True}),
+        (CheckResult, [Criteria("ID", "==", "user:task/check@user:task")], {"first": True}),
+        (CheckResult, [Criteria("USER_ID", "==", "user"), Criteria("TASK_ID", "==", "task")], {}),
+        (TaskScore, [Criteria("USER_ID", "==", "user")], {}),
+        (
+            TaskScore,
+            [Criteria("TASK_ID", "==", "task"), Criteria("USER_ID", "==", "user"), Criteria("name", "==", "name")],
+            {"first": True},
+        ),
+        (UserScore, [Criteria("USER_ID", "==", "user"), Criteria("name", "==", "name")], {"first": True}),
+        (RawData, [Criteria("ID", "==", "md5")], {"first": True}),
+        (Solution, [Criteria("ID", "==", "user:task")], {"as_of": 1, "first": True}),
+        (Solution, [Criteria("TASK_ID", "==", "task")], {"as_of": 1}),
+    ]
+
+    @pytest.mark.parametrize("obj_type, criteria, options", shapes)
+    def test_no_full_scan(self, executed_queries, obj_type, criteria, options):
+        result = search(obj_type, *criteria, **options)
+        if not options.get("first"):
+            list(result)
+        assert executed_queries
+        with get_engine().connect() as connection:
+            for statement, parameters in list(executed_queries):
+                plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                details = [row.detail for row in plan]
+                scanned = {detail.split()[1] for detail in details if detail.startswith("SCAN ")}
+                assert not scanned & set(Base.metadata.tables), f"{statement} plan is {details}"
+                # as_of shapes scan only the materialized latest versions subquery, which is searched by index itself
+                materialized = {detail.split()[1] for detail in details if detail.startswith("MATERIALIZE ")}
+                assert scanned <= materialized, f"{statement} plan is {details}"
+
+
+@pytest.mark.sqlite
+class TestMigrations:
+    def test_encode_file_tables(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        Base.metadata.create_all(engine)
+        content, checks = {"prog.py": b"print(1)"}, {"check": [1, {"size": 2}]}
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                'INSERT INTO solution ("ID", "USER_ID", "TASK_ID", timestamp, content, checks) '
+                "VALUES ('ID', 'USER_ID', 'TASK_ID', 1, ?, ?)",
+                (pickle.dumps(content), pickle.dumps(checks)),
+            )
+
+        upgrade(engine)
+
+        with engine.connect() as connection:
+            raw = connection.exec_driver_sql("SELECT content, checks FROM solution").one()
+            assert all(filetable.is_encoded(value) for value in raw)
+            row = connection.execute(select(models.Solution.content, models.Solution.checks)).one()
+            assert row.content == {"prog.py": content_hash(b"print(1)")}
+            assert row.checks == checks
+            assert connection.execute(select(blob_table.c.content)).scalar() == b"print(1)"
+            assert connection.exec_driver_sql("PRAGMA user_version").scalar() > 0
+
+    def test_fill_latest_versions(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            for timestamp in (1, 3, 2):
+                connection.execute(
+                    models.Solution.__table__.insert().values(
+                        ID="ID", USER_ID="USER_ID", TASK_ID="TASK_ID", timestamp=timestamp, content={}, checks={}
+                    )
+                )
+
+        upgrade(engine)
+
+        with engine.connect() as connection:
+            assert connection.execute(select(latest_version_table)).all() == [("solution", "ID", 3)]
+            assert connection.execute(select(journal_table.c.ID, journal_table.c.timestamp)).all() == [
+                ("ID", 1),
+                ("ID", 2),
+                ("ID", 3),
+            ]
+
+    def test_index_solution_sources(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(
+                models.Solution.__table__.insert().values(
+                    ID="ID", USER_ID="USER_ID", TASK_ID="TASK_ID", timestamp=1, content={"prog.py": b"eval"}, checks={}
+                )
+            )
+
+        upgrade(engine)
+
+        with engine.connect() as connection:
+            assert connection.execute(
+                select(models.solution_file_table.c.ID, models.solution_file_table.c.path)
+            ).all() == [("ID", "prog.py")]
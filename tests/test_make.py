@@ -12,6 +12,7 @@ from hworker.make import (
     get_solution,
     parse_homework_and_store,
     parse_all_stored_homeworks,
+    parse_new_homeworks,
     check_all_solutions,
     check_new_solutions,
     fit_deadline,
@@ -209,6 +210,33 @@ class TestMake:
         delete(Solution)
         delete(Check)
 
+    def test_parse_new_homeworks(self, example_homework, example_homework_new_solution):
+        clean_up_database()
+        parse_new_homeworks()
+        store(example_homework)
+        parse_new_homeworks()
+        assert list(search(Solution)) == [example_solution]
+        delete(Solution)
+        parse_new_homeworks()
+        assert list(search(Solution)) == []
+
+        store(example_homework_new_solution)
+        parse_new_homeworks()
+        assert [solution.content for solution in search(Solution)] == [
+            get_solution(example_homework_new_solution).content
+        ]
+        clean_up_database()
+
+    def test_parse_all_then_new(self, example_homework):
+        clean_up_database()
+        store(example_homework)
+        parse_all_stored_homeworks()
+        delete(Solution)
+        # homeworks parsed by full pass are not parsed again
+        parse_new_homeworks()
+        assert list(search(Solution)) == []
+        clean_up_database()
+
     def test_parse_update_solution(self, checked_example_homework, example_homework_new_solution):
         old_checks_results: list[CheckResult] = list(search(CheckResult))
 
@@ -0,0 +1,43 @@
+"""Tests for score functions"""
+import pytest
+
+import hworker.score as score
+from hworker.depot import delete, search, store
+from hworker.depot.objects import CheckResult, Criteria, FinalScore, TaskScore, UpdateTime, UserScore
+
+
+@pytest.fixture(scope="function")
+def qualifiers(monkeypatch):
+    inputs = {}
+
+    def remember(name, rating):
+        def qualifier(scores):
+            inputs[name] = scores
+            return rating(scores)
+
+        return qualifier
+
+    functions = {
+        "task_qualifier": {"done": remember("done", lambda results: 1)},
+        "user_qualifier": {"total": remember("total", lambda scores: sum(score.rating for score in scores))},
+        "formula": {"final": remember("final", lambda scores: sum(score.rating for score in scores))},
+    }
+    monkeypatch.setattr(score, "_get_functions_from_module", functions.get)
+    monkeypatch.setattr(score.config, "get_uids", lambda: ["user"])
+    monkeypatch.setattr(score.config, "get_tasks_list", lambda: ["task1", "task2"])
+    yield inputs
+    for obj_type in TaskScore, UserScore, FinalScore, UpdateTime, CheckResult:
+        delete(obj_type)
+
+
+class TestScore:
+    def test_perform_qualifiers(self, qualifiers):
+        store(TaskScore(ID="user/old/done", USER_ID="user", TASK_ID="old", timestamp=1, name="done", rating=10))
+        score.perform_qualifiers()
+
+        task_scores = list(search(TaskScore, Criteria("USER_ID", "==", "user")))
+        assert sorted(task_score.TASK_ID for task_score in task_scores) == ["task1", "task2"]
+        # qualifiers get scores read back from depot, without the ones stored before the run
+        assert qualifiers["total"] == task_scores
+        assert qualifiers["final"] == list(search(UserScore, Criteria("USER_ID", "==", "user")))
+        assert [float(final.rating) for final in search(FinalScore)] == [2]